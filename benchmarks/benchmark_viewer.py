@@ -0,0 +1,170 @@
+# Benchmarks of the upload and draw paths of the viewer.
+#
+# Runs headless (standalone context, e.g. EGL with llvmpipe) and writes the results to a JSON file:
+#
+#   python benchmarks/benchmark_viewer.py --output benchmark_results.json
+#
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from umbra import MeshViewer
+
+def create_geometry(num_vertices, seed=0):
+    rng = np.random.default_rng(seed)
+    v = rng.random((num_vertices, 3), dtype=np.float32) - 0.5
+    c = rng.random((num_vertices, 3), dtype=np.float32)
+    f = rng.integers(0, num_vertices, size=(2*num_vertices, 3), dtype=np.int32)
+    return v, c, f
+
+def summarize(times):
+    times = 1000*np.array(times)
+    return {
+        'mean_ms': float(times.mean()),
+        'min_ms': float(times.min()),
+        'p50_ms': float(np.percentile(times, 50)),
+        'p95_ms': float(np.percentile(times, 95)),
+    }
+
+def benchmark_uploads(viewer: MeshViewer, vertex_counts, repeats):
+    results = []
+
+    for num_vertices in vertex_counts:
+        v, c, f = create_geometry(num_vertices)
+
+        uploads = {
+            'points': lambda: viewer.set_points(v, c=c, object_name='upload_points'),
+            'mesh': lambda: viewer.set_mesh(v, f, c=c, object_name='upload_mesh'),
+            'lines': lambda: viewer.set_lines(v[0::2], v[1::2], c=c[0::2], object_name='upload_lines'),
+        }
+
+        for kind, upload in uploads.items():
+            # The first upload allocates the buffers
+            upload()
+            viewer.synchronize()
+
+            times = []
+            for _ in range(repeats):
+                t_start = time.perf_counter()
+                upload()
+                viewer.synchronize()
+                times.append(time.perf_counter() - t_start)
+
+            result = {'kind': kind, 'num_vertices': num_vertices, **summarize(times)}
+            result['vertices_per_second'] = num_vertices / (result['mean_ms'] / 1000)
+            results.append(result)
+            print(f"upload {kind:<6} {num_vertices:>9} vertices: {result['mean_ms']:9.3f} ms")
+
+        viewer.clear()
+
+    return results
+
+def benchmark_latency(viewer: MeshViewer, vertex_counts, repeats):
+    # Time from enqueuing an update until a frame containing it is rendered (and read back)
+    results = []
+
+    for num_vertices in vertex_counts:
+        v, c, _ = create_geometry(num_vertices)
+
+        viewer.set_points(v, c=c, object_name='latency_points')
+        viewer.render_to_array()
+
+        times = []
+        for i in range(repeats):
+            t_start = time.perf_counter()
+            viewer.set_points(v + 1e-3*i, c=c, object_name='latency_points')
+            viewer.render_to_array()
+            times.append(time.perf_counter() - t_start)
+
+        result = {'num_vertices': num_vertices, **summarize(times)}
+        results.append(result)
+        print(f"latency {num_vertices:>9} vertices: {result['mean_ms']:9.3f} ms")
+
+        viewer.clear()
+
+    return results
+
+def benchmark_frames(viewer: MeshViewer, object_counts, materials, vertices_per_object, repeats):
+    results = []
+
+    for num_objects in object_counts:
+        for i in range(num_objects):
+            v, c, f = create_geometry(vertices_per_object, seed=i)
+            v = v / np.cbrt(num_objects) + (np.random.default_rng(i).random(3) - 0.5)
+
+            name = f'object_{i}'
+            viewer.set_mesh(v, f, c=c, object_name=name)
+            viewer.set_material(materials[i % len(materials)], object_name=name)
+
+        # Warm up (e.g. first use of programs)
+        viewer.render_to_array()
+
+        times = []
+        for _ in range(repeats):
+            t_start = time.perf_counter()
+            viewer.render_to_array()
+            times.append(time.perf_counter() - t_start)
+
+        stats = viewer.stats()
+        result = {'num_objects': num_objects, 'materials': materials, **summarize(times)}
+        if 'gpu' in stats:
+            result['gpu_p50_ms'] = stats['gpu']['p50']
+        results.append(result)
+        print(f"frame {num_objects:>5} objects: {result['mean_ms']:9.3f} ms")
+
+        viewer.clear()
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the upload and draw paths of the viewer")
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help="Path of the JSON results")
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--max_vertices', type=float, default=1e7, help="Largest vertex count of the upload benchmarks (powers of 10 from 1e3)")
+    parser.add_argument('--max_objects', type=int, default=1000, help="Largest object count of the frame benchmarks (powers of 10 from 1)")
+    parser.add_argument('--quick', action='store_true', help="Shortcut for --max_vertices 1e5 --max_objects 100 --repeats 3")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.max_vertices = min(args.max_vertices, 1e5)
+        args.max_objects = min(args.max_objects, 100)
+        args.repeats = min(args.repeats, 3)
+
+    vertex_counts = [10**e for e in range(3, int(np.log10(args.max_vertices)) + 1)]
+    object_counts = [10**e for e in range(0, int(np.log10(args.max_objects)) + 1)]
+
+    viewer = MeshViewer(width=args.width, height=args.height, headless=True)
+    viewer.synchronize()
+
+    try:
+        results = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'context': viewer.context_info,
+            'resolution': [args.width, args.height],
+            'repeats': args.repeats,
+            'uploads': benchmark_uploads(viewer, vertex_counts, args.repeats),
+            'latency': benchmark_latency(viewer, vertex_counts, args.repeats),
+            'frames': benchmark_frames(viewer, object_counts, ['face', 'smooth', 'wireframe'], 1000, args.repeats),
+        }
+    finally:
+        viewer.close()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"Results written to '{args.output}'")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import asyncio
+from collections import namedtuple
+import threading
+
+from .viewer import MeshViewer
+
+# Input event of the viewer window. The type is one of ['mouse_button', 'mouse_drag', 'mouse_scroll', 'key']
+# and `args` are the arguments of the corresponding user callback of `MeshViewer` (e.g. (button, action, mods)).
+InputEvent = namedtuple('InputEvent', ['type', 'args'])
+
+class AsyncMeshViewer:
+    # asyncio interface of a `MeshViewer`. Updates are awaitable and complete when the render thread
+    # has applied them. The futures of the viewer are bridged to the event loop, without a thread per call.
+    # An update returns True if it was applied and False if it was dropped (see the command queue policies
+    # of `MeshViewer`) or the viewer was closed. Exceptions of the update are raised.
+    #
+    # With a bounded command queue (see `MeshViewer`), enqueuing an update can block the event loop while the
+    # queue is full. The policies 'drop_oldest' and 'drop_newest' avoid this for geometry updates, which are dropped.
+    event_types = ['mouse_button', 'mouse_drag', 'mouse_scroll', 'key']
+
+    def __init__(self, *args, viewer: MeshViewer=None, **kwargs):
+        self.viewer = viewer if viewer is not None else MeshViewer(*args, **kwargs)
+
+        # Event loops and queues of the active event iterators
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+        # Forward the input callbacks (keeping callbacks that are already set)
+        for event_type in AsyncMeshViewer.event_types:
+            self.__hook_callback(event_type)
+
+        # Event iterators end when the viewer is closed
+        self.viewer.closed_future.add_done_callback(lambda _: self.__publish(None))
+
+    async def set_points(self, *args, **kwargs):
+        return await self.__wait(self.viewer.set_points(*args, **kwargs))
+
+    async def set_mesh(self, *args, **kwargs):
+        return await self.__wait(self.viewer.set_mesh(*args, **kwargs))
+
+    async def set_lines(self, *args, **kwargs):
+        return await self.__wait(self.viewer.set_lines(*args, **kwargs))
+
+    async def update_mesh_attributes(self, *args, **kwargs):
+        return await self.__wait(self.viewer.update_mesh_attributes(*args, **kwargs))
+
+    async def update_points_attributes(self, *args, **kwargs):
+        return await self.__wait(self.viewer.update_points_attributes(*args, **kwargs))
+
+    async def set_instances(self, *args, **kwargs):
+        return await self.__wait(self.viewer.set_instances(*args, **kwargs))
+
+    async def set_instance_transforms(self, *args, **kwargs):
+        return await self.__wait(self.viewer.set_instance_transforms(*args, **kwargs))
+
+    async def set_object_transform(self, *args, **kwargs):
+        return await self.__wait(self.viewer.set_object_transform(*args, **kwargs))
+
+    async def set_visible(self, *args, **kwargs):
+        return await self.__wait(self.viewer.set_visible(*args, **kwargs))
+
+    async def set_material(self, *args, **kwargs):
+        return await self.__wait(self.viewer.set_material(*args, **kwargs))
+
+    async def remove_material(self, *args, **kwargs):
+        return await self.__wait(self.viewer.remove_material(*args, **kwargs))
+
+    async def remove_object(self, *args, **kwargs):
+        return await self.__wait(self.viewer.remove_object(*args, **kwargs))
+
+    async def clear(self):
+        return await self.__wait(self.viewer.clear())
+
+    async def synchronize(self):
+        # Wait until all previously enqueued commands are executed
+        return await self.__wait(self.viewer.synchronize(wait=False))
+
+    async def closed(self):
+        # Wait until the viewer is closed (e.g. the window by the user). Cancelling the waiting task
+        # does not cancel the shared future of the viewer.
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+
+        def resolve(future):
+            if result.cancelled():
+                return
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(None)
+
+        def done(future):
+            try:
+                loop.call_soon_threadsafe(resolve, future)
+            except RuntimeError:
+                # The event loop is closed
+                pass
+
+        self.viewer.closed_future.add_done_callback(done)
+        await result
+
+    async def close(self):
+        self.viewer.close()
+        await self.closed()
+
+    async def events(self):
+        # Iterate over the input events (see `InputEvent`) until the viewer is closed
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+
+        with self.lock:
+            self.subscribers = self.subscribers + [subscriber]
+
+        # The viewer could have been closed before subscribing
+        if self.viewer.closed_future.done():
+            subscriber[1].put_nowait(None)
+
+        try:
+            while True:
+                event = await subscriber[1].get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            with self.lock:
+                self.subscribers = [s for s in self.subscribers if s is not subscriber]
+
+    async def __wait(self, future):
+        # Unlike `asyncio.wrap_future`, a cancelled (dropped) update does not cancel the awaiting task,
+        # and cancelling the task does not cancel the update
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+
+        def resolve(future):
+            if result.cancelled():
+                return
+            if future.cancelled():
+                result.set_result(False)
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(True)
+
+        def done(future):
+            try:
+                loop.call_soon_threadsafe(resolve, future)
+            except RuntimeError:
+                # The event loop is closed
+                pass
+
+        future.add_done_callback(done)
+        return await result
+
+    def __hook_callback(self, event_type):
+        name = f'user_{event_type}_callback'
+        previous_callback = getattr(self.viewer, name)
+
+        def callback(*args):
+            if previous_callback:
+                previous_callback(*args)
+            self.__publish(InputEvent(event_type, args))
+
+        setattr(self.viewer, name, callback)
+
+    def __publish(self, event):
+        # Called on the render thread, events are handed over to the event loops of the iterators
+        for loop, queue in self.subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The event loop is closed
+                pass
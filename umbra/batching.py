@@ -0,0 +1,152 @@
+import moderngl
+import numpy as np
+
+class RangeAllocator:
+    # First-fit allocator of vertex ranges in a shared buffer. Freed ranges are merged with their neighbors.
+    def __init__(self):
+        self.size = 0
+        self.free = []
+
+    def allocate(self, count):
+        for i, (start, free_count) in enumerate(self.free):
+            if free_count >= count:
+                if free_count == count:
+                    self.free.pop(i)
+                else:
+                    self.free[i] = (start + count, free_count - count)
+                return start
+
+        start = self.size
+        self.size += count
+        return start
+
+    def release(self, start, count):
+        self.free.append((start, count))
+        self.free.sort()
+
+        merged = []
+        for start, count in self.free:
+            if len(merged) > 0 and merged[-1][0] + merged[-1][1] == start:
+                merged[-1] = (merged[-1][0], merged[-1][1] + count)
+            else:
+                merged.append((start, count))
+
+        # Free space at the end is returned
+        if len(merged) > 0 and merged[-1][0] + merged[-1][1] == self.size:
+            self.size = merged.pop()[0]
+
+        self.free = merged
+
+class Batch:
+    # Vertices (positions and colors) of many small objects with the same primitive type and program in shared buffers.
+    #
+    # Each object occupies a range of vertices, so updating or removing an object only rewrites its range.
+    # All objects are drawn with a single indirect multi-draw call (one draw command per visible object).
+    def __init__(self, context: moderngl.Context, program: moderngl.Program, mode, growth_factor=2.0, initial_capacity=4096):
+        self.context = context
+        self.program = program
+        self.mode = mode
+        self.growth_factor = growth_factor
+
+        self.allocator = RangeAllocator()
+        self.capacity = initial_capacity
+        self.vbo = context.buffer(reserve=12*self.capacity)
+        self.vcbo = context.buffer(reserve=12*self.capacity)
+        self.vao = self.__create_vao()
+
+        # Range (start, count) by object name
+        self.ranges = {}
+
+        self.indirect_buffer = None
+        self.commands = None
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def write(self, name, v_flat: np.ndarray, c_flat: np.ndarray):
+        # Write the vertices of an object, reusing its range if the number of vertices did not change.
+        # Returns the number of uploaded bytes.
+        count = len(v_flat) // 3
+
+        if name in self.ranges and self.ranges[name][1] != count:
+            self.remove(name)
+
+        if not name in self.ranges:
+            start = self.allocator.allocate(count)
+            if self.allocator.size > self.capacity:
+                self.__grow(self.allocator.size)
+            self.ranges[name] = (start, count)
+            self.commands = None
+
+        start, _ = self.ranges[name]
+        self.vbo.write(v_flat, offset=12*start)
+        self.vcbo.write(c_flat, offset=12*start)
+
+        return v_flat.nbytes + c_flat.nbytes
+
+    def remove(self, name):
+        start, count = self.ranges.pop(name)
+        self.allocator.release(start, count)
+        self.commands = None
+
+    def copy_to(self, name, vbo: moderngl.Buffer, vcbo: moderngl.Buffer):
+        # Copy the vertices of an object into separate buffers (on the GPU)
+        start, count = self.ranges[name]
+        if count == 0:
+            return
+        self.context.copy_buffer(vbo, self.vbo, size=12*count, read_offset=12*start)
+        self.context.copy_buffer(vcbo, self.vcbo, size=12*count, read_offset=12*start)
+
+    def render(self, hidden=set()):
+        # Draw all objects except the hidden ones (e.g. culled) with one call. Returns the number of draw calls.
+        if self.commands is None:
+            # Draw commands (count, instance count, first vertex, base instance), rebuilt if the ranges changed.
+            # moderngl reads the commands with a stride of 20 bytes, so they are padded.
+            self.names = list(self.ranges.keys())
+            self.commands = np.array([(count, 1, start, 0, 0) for start, count in self.ranges.values()], dtype=np.uint32).reshape(-1, 5)
+            self.drawn_commands = None
+
+        commands = self.commands
+        if not hidden.isdisjoint(self.ranges.keys()):
+            commands = commands[[not name in hidden for name in self.names]]
+
+        if len(commands) == 0:
+            return 0
+
+        if self.drawn_commands is None or not np.array_equal(commands, self.drawn_commands):
+            if self.indirect_buffer is None or self.indirect_buffer.size < commands.nbytes:
+                if self.indirect_buffer is not None:
+                    self.indirect_buffer.release()
+                self.indirect_buffer = self.context.buffer(reserve=int(self.growth_factor*commands.nbytes))
+            self.indirect_buffer.write(commands)
+            self.drawn_commands = commands
+
+        self.vao.render_indirect(self.indirect_buffer, mode=self.mode, count=len(commands))
+        return 1
+
+    def release(self):
+        self.vao.release()
+        self.vbo.release()
+        self.vcbo.release()
+        if self.indirect_buffer is not None:
+            self.indirect_buffer.release()
+
+    def __create_vao(self):
+        content = [(self.vbo, '3f', 'position')]
+        if self.program.get('color', None):
+            content += [(self.vcbo, '3f', 'color')]
+        return self.context.vertex_array(self.program, content)
+
+    def __grow(self, min_capacity):
+        # Reallocate the buffers and copy the existing vertices on the GPU
+        capacity = max(min_capacity, int(self.growth_factor*self.capacity))
+
+        for name in ['vbo', 'vcbo']:
+            buffer = self.context.buffer(reserve=12*capacity)
+            self.context.copy_buffer(buffer, getattr(self, name), size=12*self.capacity)
+            getattr(self, name).release()
+            setattr(self, name, buffer)
+
+        self.capacity = capacity
+        self.vao.release()
+        self.vao = self.__create_vao()
@@ -14,6 +14,9 @@ class PerspectiveCamera:
 
         self._viewport = viewport
 
+        # Incremented whenever the camera changes (e.g. to detect if a redraw is necessary)
+        self.version = 0
+
         self.mark_dirty()
 
     def mark_dirty(self):
@@ -22,9 +25,13 @@ class PerspectiveCamera:
 
     def mark_view_dirty(self):
         self._view_matrix = None
+        self._frustum_planes = None
+        self.version += 1
 
     def mark_projection_dirty(self):
         self.projection_matrix_ = None
+        self._frustum_planes = None
+        self.version += 1
 
     @property
     def viewport(self):
@@ -50,4 +57,15 @@ class PerspectiveCamera:
             aspect_ratio = width / height
             self.projection_matrix_ = create_perspective_projection_matrix(self.fov, aspect_ratio, self.near, self.far)
 
-        return self.projection_matrix_
\ No newline at end of file
+        return self.projection_matrix_
+
+    @property
+    def frustum_planes(self):
+        # Planes (6,4) of the view frustum in world space (normals point inwards)
+        if self._frustum_planes is None:
+            # See: Gribb and Hartmann, "Fast Extraction of Viewing Frustum Planes from the World-View-Projection Matrix"
+            M = self.projection_matrix.astype(np.float64) @ self.view_matrix
+            planes = np.stack([M[3] + M[0], M[3] - M[0], M[3] + M[1], M[3] - M[1], M[3] + M[2], M[3] - M[2]])
+            self._frustum_planes = planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+        return self._frustum_planes
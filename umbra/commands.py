@@ -0,0 +1,163 @@
+from collections import Counter, deque
+import threading
+
+class _PendingCommand:
+    __slots__ = ['command', 'object_name', 'operation', 'droppable', 'futures']
+
+    def __init__(self, command, object_name, operation, droppable, futures):
+        self.command = command
+        self.object_name = object_name
+        self.operation = operation
+        self.droppable = droppable
+        self.futures = futures
+
+# Queue of render thread commands with latest-wins coalescing of geometry updates.
+#
+# Commands enqueued with an `operation` replace a still pending command for the same
+# object and operation, so only the newest update reaches the GPU. A pending command can
+# only be replaced while it is the most recent command for its object, which preserves the
+# ordering with respect to other commands (e.g. materials or removal) of the same object.
+# Commands without an operation are never coalesced.
+#
+# Each command has a future, which is resolved when it is executed. The futures of superseded
+# commands are resolved with their replacement.
+#
+# With `maxsize` > 0, the number of pending commands is bounded. If the queue is full, the policy
+# 'block' waits for the render thread, 'drop_oldest' drops the oldest pending update and 'drop_newest'
+# drops the new update. Only streamed geometry updates (commands enqueued as `droppable`) are dropped and
+# their futures are cancelled, other commands (e.g. visibility, transforms or removal) wait for space.
+class CommandQueue:
+    policies = ['block', 'drop_oldest', 'drop_newest']
+
+    def __init__(self, coalesce=True, maxsize=0, policy='block'):
+        if policy not in CommandQueue.policies:
+            raise RuntimeError(f"Unknown command queue policy '{policy}', expected one of {CommandQueue.policies}.")
+
+        self.coalesce = coalesce
+        self.maxsize = maxsize
+        self.policy = policy
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._queue = deque()
+        self._closed = False
+
+        # Most recent pending command by object name
+        self._pending = {}
+
+        self.num_enqueued = 0
+        self.num_executed = 0
+        self.num_dropped = 0
+        self.num_overflowed = 0
+        self.dropped_by_object = Counter()
+
+    def put(self, command, object_name=None, operation=None, droppable=False, future=None, block=True):
+        # Without `block` (e.g. on the render thread, which would wait for itself), the bound is ignored
+        futures = [] if future is None else [future]
+
+        with self._lock:
+            if self._closed:
+                for f in futures:
+                    f.cancel()
+                return
+
+            self.num_enqueued += 1
+
+            if operation is None:
+                # Commands without an operation act as barriers
+                if object_name is None:
+                    self._pending.clear()
+                else:
+                    self._pending.pop(object_name, None)
+            elif self.coalesce:
+                pending = self._pending.get(object_name, None)
+                if pending is not None and pending.operation == operation:
+                    # Replace the superseded command in place, dropping its captured data
+                    pending.command = command
+                    pending.futures += futures
+                    self.num_dropped += 1
+                    self.dropped_by_object[object_name] += 1
+                    return
+
+            if block and self.maxsize > 0 and len(self._queue) >= self.maxsize:
+                if droppable and self.policy == 'drop_newest':
+                    self.num_overflowed += 1
+                    for f in futures:
+                        f.cancel()
+                    return
+
+                if droppable and self.policy == 'drop_oldest':
+                    self.__drop_oldest_update()
+
+                self._not_full.wait_for(lambda: len(self._queue) < self.maxsize or self._closed)
+
+                if self._closed:
+                    for f in futures:
+                        f.cancel()
+                    return
+
+            entry = _PendingCommand(command, object_name, operation, droppable, futures)
+            self._queue.append(entry)
+
+            if operation is not None:
+                self._pending[object_name] = entry
+
+            self._not_empty.notify()
+
+    def get_nowait(self):
+        # Returns the command and its futures
+        with self._lock:
+            entry = self._queue.popleft()
+
+            if self._pending.get(entry.object_name, None) is entry:
+                del self._pending[entry.object_name]
+
+            self.num_executed += 1
+            self._not_full.notify()
+
+        return entry.command, entry.futures
+
+    def wait_for_commands(self, timeout=None):
+        with self._not_empty:
+            return self._not_empty.wait_for(lambda: len(self._queue) > 0, timeout=timeout)
+
+    def close(self):
+        # Cancel the pending commands and all later ones (e.g. after the viewer was closed)
+        with self._lock:
+            self._closed = True
+            for entry in self._queue:
+                for f in entry.futures:
+                    f.cancel()
+            self._queue.clear()
+            self._pending.clear()
+            self._not_full.notify_all()
+
+    def empty(self):
+        return len(self._queue) == 0
+
+    def qsize(self):
+        return len(self._queue)
+
+    def statistics(self):
+        with self._lock:
+            return {
+                'enqueued': self.num_enqueued,
+                'executed': self.num_executed,
+                'dropped': self.num_dropped,
+                'overflowed': self.num_overflowed,
+                'pending': len(self._queue),
+                'dropped_by_object': dict(self.dropped_by_object),
+            }
+
+    def __drop_oldest_update(self):
+        # Make space by dropping the oldest pending droppable update (if there is one)
+        for entry in self._queue:
+            if entry.droppable:
+                self._queue.remove(entry)
+                if self._pending.get(entry.object_name, None) is entry:
+                    del self._pending[entry.object_name]
+                for f in entry.futures:
+                    f.cancel()
+                self.num_overflowed += 1
+                return
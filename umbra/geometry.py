@@ -0,0 +1,81 @@
+import numpy as np
+
+def compute_bounding_box(v: np.ndarray):
+    # Axis-aligned bounding box (2,3) with minimum and maximum of the points v (N,3)
+    if len(v) == 0:
+        return None
+    return np.stack([v.min(axis=0), v.max(axis=0)]).astype(np.float64)
+
+def merge_bounding_boxes(a, b):
+    if a is None or b is None:
+        return b if a is None else a
+    return np.stack([np.minimum(a[0], b[0]), np.maximum(a[1], b[1])])
+
+def transform_bounding_boxes(boxes: np.ndarray, M: np.ndarray):
+    # Bounding boxes (K,2,3) of the transformed boxes (K,2,3) with the 4x4 matrices M (4,4) or (K,4,4)
+    center = 0.5*(boxes[:, 0] + boxes[:, 1])
+    extent = 0.5*(boxes[:, 1] - boxes[:, 0])
+
+    M = np.broadcast_to(M, (len(boxes), 4, 4))
+    center = np.einsum('kij,kj->ki', M[:, :3, :3], center) + M[:, :3, 3]
+    extent = np.einsum('kij,kj->ki', np.abs(M[:, :3, :3]), extent)
+
+    return np.stack([center - extent, center + extent], axis=1)
+
+def intersect_frustum(planes: np.ndarray, boxes: np.ndarray):
+    # Test bounding boxes (K,2,3) against frustum planes (6,4) with inward-pointing normals.
+    # Returns a mask (K,) that is False for boxes that are entirely outside of the frustum.
+    center = 0.5*(boxes[:, 0] + boxes[:, 1])
+    extent = 0.5*(boxes[:, 1] - boxes[:, 0])
+
+    distance = center @ planes[:, :3].T + planes[:, 3]
+    radius = extent @ np.abs(planes[:, :3]).T
+
+    return ~np.any(distance < -radius, axis=1)
+
+class VertexNormals:
+    # Area-weighted vertex normals of a triangle mesh with fixed faces f (F,3).
+    #
+    # The face-to-vertex incidence (the vertex of each face corner) is prepared once, so computing
+    # the normals for new vertex positions (e.g. of a deforming mesh) is one weighted `np.bincount` per axis.
+    def __init__(self, f: np.ndarray, num_vertices):
+        self.f = np.array(f, dtype=np.int64).reshape(-1, 3)
+        self.num_vertices = num_vertices
+        self.corners = np.ascontiguousarray(self.f.reshape(-1))
+
+    def matches(self, f: np.ndarray, num_vertices):
+        return num_vertices == self.num_vertices and f.size == self.f.size and np.array_equal(self.f, f.reshape(-1, 3))
+
+    def __call__(self, v: np.ndarray):
+        v = np.asarray(v, dtype=np.float32).reshape(-1, 3)
+
+        # The cross product of two edges is the face normal scaled by twice the face area
+        a = v[self.f[:, 0]]
+        e1 = v[self.f[:, 1]] - a
+        e2 = v[self.f[:, 2]] - a
+        face_normals = [
+            e1[:, 1]*e2[:, 2] - e1[:, 2]*e2[:, 1],
+            e1[:, 2]*e2[:, 0] - e1[:, 0]*e2[:, 2],
+            e1[:, 0]*e2[:, 1] - e1[:, 1]*e2[:, 0]
+        ]
+
+        # Sum over the corners of each vertex
+        n = np.empty((self.num_vertices, 3), dtype=np.float32)
+        for i in range(3):
+            n[:, i] = np.bincount(self.corners, weights=np.repeat(face_normals[i], 3), minlength=self.num_vertices)
+
+        # Isolated vertices keep a zero normal
+        length = np.linalg.norm(n, axis=1, keepdims=True)
+        return n / np.where(length > 0, length, 1)
+
+def compute_unique_edges(f: np.ndarray):
+    # Unique (undirected) edges of the faces f (F,3) as flat line indices (2E,)
+    f = np.asarray(f, dtype=np.int64).reshape(-1, 3)
+
+    edges = np.concatenate([f[:, [0, 1]], f[:, [1, 2]], f[:, [2, 0]]])
+    edges.sort(axis=1)
+
+    # Pack both vertex indices into a single key, so the edges are sorted and deduplicated in one pass
+    keys = np.unique((edges[:, 0] << 32) | edges[:, 1])
+
+    return np.stack([keys >> 32, keys & 0xffffffff], axis=1).astype(np.uint32).reshape(-1)
@@ -0,0 +1,239 @@
+import heapq
+import math
+
+import moderngl
+import numpy as np
+
+from .geometry import intersect_frustum
+
+class PointOctree:
+    # Octree for level-of-detail rendering of large point clouds.
+    #
+    # Each node stores a random subset of at most `max_points_per_node` of the points in its cell
+    # that are not stored by its ancestors (similar to Potree). Drawing a node and its ancestors
+    # shows a uniform subsample of the cell, so coarse nodes give a quick preview of the whole
+    # point cloud and finer nodes add detail. Built with vectorized NumPy operations, level by level.
+    def __init__(self, v: np.ndarray, c: np.ndarray, max_points_per_node=20000, max_depth=16, seed=0):
+        v = np.ascontiguousarray(v, dtype=np.float32).reshape(-1, 3)
+        c = np.ascontiguousarray(c, dtype=np.float32).reshape(-1, 3)
+
+        # Cubic bounds
+        v_min = v.min(axis=0).astype(np.float64)
+        v_max = v.max(axis=0).astype(np.float64)
+        self.size = max(float((v_max - v_min).max()), 1e-8)
+        self.origin = v_min
+        self.aabb = np.stack([v_min, v_max])
+
+        # Random order, so taking the first points of a cell is a random subsample
+        remaining = np.random.default_rng(seed).permutation(len(v))
+
+        levels = []
+        keys = []
+        starts = []
+        counts = []
+        order = []
+        num_ordered = 0
+
+        for level in range(max_depth + 1):
+            if len(remaining) == 0:
+                break
+
+            # Integer cell coordinates and packed cell keys at this level
+            resolution = 2**level
+            q = np.floor((v[remaining] - self.origin) / self.size * resolution).astype(np.int64)
+            q = np.clip(q, 0, resolution - 1)
+            cell = (q[:, 0] << (2*level)) | (q[:, 1] << level) | q[:, 2]
+
+            # Group by cell (stable, so the random order within a cell is preserved)
+            sorting = np.argsort(cell, kind='stable')
+            cell = cell[sorting]
+            remaining = remaining[sorting]
+
+            group_starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+            group_counts = np.diff(np.r_[group_starts, len(cell)])
+            rank = np.arange(len(cell)) - np.repeat(group_starts, group_counts)
+
+            # The last level keeps all remaining points
+            selected = rank < max_points_per_node if level < max_depth else np.ones(len(cell), dtype=bool)
+
+            node_counts = np.minimum(group_counts, max_points_per_node) if level < max_depth else group_counts
+            node_starts = num_ordered + np.r_[0, np.cumsum(node_counts)[:-1]]
+
+            levels.append(np.full(len(group_starts), level))
+            keys.append(cell[group_starts])
+            starts.append(node_starts)
+            counts.append(node_counts)
+            order.append(remaining[selected])
+            num_ordered += int(node_counts.sum())
+
+            remaining = remaining[~selected]
+
+        # Points and colors in node order
+        order = np.concatenate(order)
+        self.points = v[order]
+        self.colors = c[order]
+
+        self.levels = np.concatenate(levels)
+        self.keys = np.concatenate(keys)
+        self.starts = np.concatenate(starts)
+        self.counts = np.concatenate(counts)
+
+        # Cell bounds of the nodes
+        resolution = 2**self.levels
+        q = np.stack([(self.keys >> (2*self.levels)), (self.keys >> self.levels) & (resolution - 1), self.keys & (resolution - 1)], axis=1)
+        cell_size = self.size / resolution
+        lower = self.origin + q * cell_size[:, None]
+        self.boxes = np.stack([lower, lower + cell_size[:, None]], axis=1)
+        self.cell_sizes = cell_size
+
+        # Children of the nodes
+        node_by_cell = {(int(level), int(key)): i for i, (level, key) in enumerate(zip(self.levels, self.keys))}
+        self.children = [[] for _ in range(len(self.levels))]
+        for i in range(1, len(self.levels)):
+            level = int(self.levels[i])
+            parent_q = q[i] >> 1
+            parent_key = (int(parent_q[0]) << (2*(level - 1))) | (int(parent_q[1]) << (level - 1)) | int(parent_q[2])
+            self.children[node_by_cell[(level - 1, parent_key)]].append(i)
+
+    def __len__(self):
+        return len(self.levels)
+
+    def select_nodes(self, planes, eye, fov, viewport_height, point_budget):
+        # Select the nodes with the largest projected size (in pixels) until the point budget is reached.
+        # A node is only selected if its parent is selected. Returns the node indices in priority order.
+        visible = intersect_frustum(planes, self.boxes)
+
+        center = 0.5*(self.boxes[:, 0] + self.boxes[:, 1])
+        distance = np.maximum(np.linalg.norm(center - eye, axis=1) - 0.5*math.sqrt(3)*self.cell_sizes, 1e-6)
+        projected_size = self.cell_sizes / (distance * math.tan(0.5*math.radians(fov))) * 0.5*viewport_height
+
+        selected = []
+        num_points = 0
+        queue = [(-projected_size[0], 0)] if len(self) > 0 and visible[0] else []
+
+        while len(queue) > 0:
+            _, node = heapq.heappop(queue)
+
+            if num_points + self.counts[node] > point_budget:
+                break
+
+            selected.append(node)
+            num_points += int(self.counts[node])
+
+            for child in self.children[node]:
+                if visible[child]:
+                    heapq.heappush(queue, (-projected_size[child], child))
+
+        return selected
+
+class LodPointCloud:
+    # GPU resources of a point octree. Nodes are uploaded on demand as separate buffers, with at most
+    # `max_upload_points` points per frame, so coarse levels are shown first and finer levels stream in.
+    # Nodes that have not been drawn recently are released if more than twice the point budget is loaded.
+    def __init__(self, context: moderngl.Context, octree: PointOctree, program: moderngl.Program, point_budget=1000000, max_upload_points=500000):
+        self.context = context
+        self.octree = octree
+        self.program = program
+        self.point_budget = point_budget
+        self.max_upload_points = max_upload_points
+
+        # Buffers (vbo, vcbo) and VAO by node
+        self.nodes = {}
+        self.last_used = {}
+        self.num_loaded_points = 0
+        self.frame = 0
+
+        # The VAOs of the currently drawn nodes
+        self.vaos = []
+
+        self.selection_key = None
+        self.selection = []
+
+    @property
+    def is_complete(self):
+        # All selected nodes are uploaded (nothing left to stream in)
+        return all(node in self.nodes for node in self.selection)
+
+    def set_program(self, program):
+        self.program = program
+        for node, (vbo, vcbo, vao) in self.nodes.items():
+            vao.release()
+            self.nodes[node] = (vbo, vcbo, self.__create_vao(vbo, vcbo))
+
+    def update(self, camera, model_matrix):
+        # Select and upload the nodes for the camera. Returns the number of uploaded bytes.
+        self.frame += 1
+
+        # The selection only changes with the camera or while nodes are streaming in. The version of a camera
+        # does not identify it (e.g. with several cameras), so the key holds the matrices and viewport.
+        selection_key = (id(camera), camera.view_matrix.tobytes(), camera.projection_matrix.tobytes(),
+                         tuple(camera.viewport), model_matrix.tobytes())
+        if selection_key != self.selection_key or any(node not in self.nodes for node in self.selection):
+            # Select in object space
+            planes = camera.frustum_planes @ model_matrix
+            planes = planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+            eye = (np.linalg.inv(model_matrix) @ np.append(camera.eye, 1.0))[:3]
+            viewport_height = camera.viewport[3] - camera.viewport[1]
+
+            self.selection = self.octree.select_nodes(planes, eye, camera.fov, viewport_height, self.point_budget)
+            self.selection_key = selection_key
+
+        # Upload missing nodes in priority order (parents first)
+        num_uploaded_bytes = 0
+        num_uploaded_points = 0
+        vaos = []
+        for node in self.selection:
+            if not node in self.nodes:
+                if num_uploaded_points >= self.max_upload_points:
+                    continue
+                num_uploaded_bytes += self.__load(node)
+                num_uploaded_points += int(self.octree.counts[node])
+
+            self.last_used[node] = self.frame
+            vaos.append(self.nodes[node][2])
+
+        self.vaos[:] = vaos
+
+        self.__evict()
+
+        return num_uploaded_bytes
+
+    def release(self):
+        for node in list(self.nodes.keys()):
+            self.__unload(node)
+        self.vaos[:] = []
+
+    def __create_vao(self, vbo, vcbo):
+        content = [(vbo, '3f', 'position')]
+        if self.program.get('color', None):
+            content += [(vcbo, '3f', 'color')]
+        return self.context.vertex_array(self.program, content)
+
+    def __load(self, node):
+        start = self.octree.starts[node]
+        end = start + self.octree.counts[node]
+
+        vbo = self.context.buffer(self.octree.points[start:end])
+        vcbo = self.context.buffer(self.octree.colors[start:end])
+        self.nodes[node] = (vbo, vcbo, self.__create_vao(vbo, vcbo))
+        self.num_loaded_points += end - start
+
+        return vbo.size + vcbo.size
+
+    def __unload(self, node):
+        vbo, vcbo, vao = self.nodes.pop(node)
+        vao.release()
+        vbo.release()
+        vcbo.release()
+        self.last_used.pop(node, None)
+        self.num_loaded_points -= int(self.octree.counts[node])
+
+    def __evict(self):
+        if self.num_loaded_points <= 2*self.point_budget:
+            return
+
+        # Least recently used first
+        for node in sorted(self.nodes.keys(), key=lambda node: self.last_used[node]):
+            if self.num_loaded_points <= 2*self.point_budget or self.last_used[node] == self.frame:
+                break
+            self.__unload(node)
@@ -1,8 +1,7 @@
 import moderngl
 import numpy as np
 
-from .shaders import mesh_vertex_shader, fragment_shader_flat
-from .utils import to_opengl_matrix
+from .shaders import coordinate_system_vertex_shader, fragment_shader_flat
 
 class Quad:
     def __init__(self, context: moderngl.Context):
@@ -76,20 +75,25 @@ class CoordinateSystem():
         ])
         self.vcbo = context.buffer(colors.ravel().astype('f4'))
 
-        self.program = context.program(
-            vertex_shader=mesh_vertex_shader,
-            fragment_shader=fragment_shader_flat
-        )
+        # The program is compiled on first use (see `render`)
+        self.program = None
+        self.vao = None
 
-        self.vao = context.vertex_array(
-            self.program,
-            [
-                (self.vbo, '3f', 'position'),
-                (self.vcbo, '3f', 'color'),
-            ]
-        )
+    def render(self, context, transforms: moderngl.Buffer):
+        if self.vao is None:
+            self.program = context.program(
+                vertex_shader=coordinate_system_vertex_shader,
+                fragment_shader=fragment_shader_flat
+            )
+
+            self.vao = context.vertex_array(
+                self.program,
+                [
+                    (self.vbo, '3f', 'position'),
+                    (self.vcbo, '3f', 'color'),
+                ]
+            )
 
-    def render(self, context, camera):
-        self.program['model_view_matrix'].write(to_opengl_matrix(camera.view_matrix))
-        self.program['projection_matrix'].write(to_opengl_matrix(camera.projection_matrix))
+        # The camera matrices are read from the `Transforms` uniform block
+        transforms.bind_to_uniform_block(0)
         self.vao.render(moderngl.LINES)
@@ -0,0 +1,37 @@
+from collections.abc import Mapping
+import os
+
+import moderngl
+
+class LazyPrograms(Mapping):
+    # Programs by name that are only compiled (and linked) on first use
+    def __init__(self, context: moderngl.Context, sources: dict):
+        self.context = context
+        self.sources = sources
+        self.programs = {}
+
+    def __getitem__(self, name):
+        if not name in self.programs:
+            self.programs[name] = self.context.program(**self.sources[name])
+        return self.programs[name]
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+def configure_shader_cache(path):
+    # moderngl cannot create programs from binaries, so compiled programs are cached on disk by the driver,
+    # which keys them by shader source and driver version. Must be configured before the context is created,
+    # variables that are already set are not overwritten.
+    path = os.path.abspath(os.path.expanduser(path))
+    os.makedirs(path, exist_ok=True)
+
+    # Mesa (and older versions of Mesa)
+    os.environ.setdefault('MESA_SHADER_CACHE_DIR', path)
+    os.environ.setdefault('MESA_GLSL_CACHE_DIR', path)
+
+    # NVIDIA
+    os.environ.setdefault('__GL_SHADER_DISK_CACHE', '1')
+    os.environ.setdefault('__GL_SHADER_DISK_CACHE_PATH', path)
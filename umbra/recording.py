@@ -0,0 +1,204 @@
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import moderngl
+import numpy as np
+
+def write_png(path, image: np.ndarray, compression_level=1):
+    # Minimal PNG encoder for 8-bit grayscale, RGB and RGBA images
+    height, width, channels = image.shape
+    color_type = {1: 0, 3: 2, 4: 6}[channels]
+
+    # Each row starts with the filter type (0 = none)
+    rows = np.zeros((height, 1 + width*channels), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, -1)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), compression_level)))
+        f.write(chunk(b'IEND', b''))
+
+class FrameWriter:
+    # Writes frames on a background thread as PNG sequence ('png'),
+    # NumPy chunks ('npz') or raw RGB chunks with JSON metadata ('raw').
+    formats = ['png', 'npz', 'raw']
+
+    def __init__(self, path, fps, format='png', chunk_size=100):
+        if format not in FrameWriter.formats:
+            raise RuntimeError(f"Unknown recording format '{format}', expected one of {FrameWriter.formats}.")
+
+        self.path = path
+        self.fps = fps
+        self.format = format
+        self.chunk_size = chunk_size
+
+        self.chunk = []
+        self.chunks = []
+
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, index, image):
+        if self.format == 'png':
+            write_png(os.path.join(self.path, f'frame_{index:06d}.png'), image)
+            return
+
+        # Chunks only contain frames of the same size
+        if len(self.chunk) > 0 and (len(self.chunk) == self.chunk_size or self.chunk[0][1].shape != image.shape):
+            self.flush()
+
+        self.chunk.append((index, image))
+
+    def flush(self):
+        if len(self.chunk) == 0:
+            return
+
+        indices = np.array([index for index, _ in self.chunk])
+        frames = np.stack([image for _, image in self.chunk])
+        name = f'frames_{indices[0]:06d}'
+
+        if self.format == 'npz':
+            np.savez(os.path.join(self.path, name + '.npz'), frames=frames, indices=indices, fps=self.fps)
+        elif self.format == 'raw':
+            frames.tofile(os.path.join(self.path, name + '.raw'))
+
+        self.chunks.append({
+            'file': name + '.' + self.format,
+            'first_frame': int(indices[0]),
+            'num_frames': len(indices),
+            'height': frames.shape[1],
+            'width': frames.shape[2],
+            'channels': frames.shape[3],
+        })
+
+        self.chunk = []
+
+    def close(self):
+        self.flush()
+
+        if self.format == 'raw':
+            with open(os.path.join(self.path, 'metadata.json'), 'w') as f:
+                json.dump({'fps': self.fps, 'dtype': 'uint8', 'chunks': self.chunks}, f, indent=2)
+
+class FrameRecorder:
+    # Records frames of a framebuffer at a fixed rate.
+    #
+    # The pixels are read into a ring of pixel buffer objects, so the transfer from the GPU overlaps
+    # with rendering the next frames and a buffer is only mapped when it is reused.
+    # Frames are passed to the writer thread through a bounded queue. If the queue is full, the
+    # policy 'block' waits for the writer and the policy 'drop' discards the frame.
+    policies = ['block', 'drop']
+
+    def __init__(self, context: moderngl.Context, path, fps=30, format='png', queue_size=64, policy='block', num_buffers=3):
+        if policy not in FrameRecorder.policies:
+            raise RuntimeError(f"Unknown recording policy '{policy}', expected one of {FrameRecorder.policies}.")
+
+        self.context = context
+        self.fps = fps
+        self.policy = policy
+        self.writer = FrameWriter(path, fps, format)
+
+        self.size = None
+        self.buffers = [None]*num_buffers
+        self.pending = [None]*num_buffers
+        self.buffer_index = 0
+
+        self.num_frames = 0
+        self.num_dropped = 0
+        self.next_capture_time = None
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.__write_frames, daemon=True)
+        self.thread.start()
+
+    def capture(self, framebuffer: moderngl.Framebuffer, viewport):
+        now = time.perf_counter()
+
+        if self.next_capture_time is not None and now < self.next_capture_time:
+            return
+
+        # Advance by the frame interval to avoid drift, but do not try to catch up after stalls
+        if self.next_capture_time is None or now - self.next_capture_time > 1/self.fps:
+            self.next_capture_time = now
+        self.next_capture_time += 1/self.fps
+
+        size = (viewport[2] - viewport[0], viewport[3] - viewport[1])
+
+        if size != self.size:
+            self.__flush_buffers()
+            for buffer in self.buffers:
+                if buffer is not None:
+                    buffer.release()
+            self.buffers = [self.context.buffer(reserve=3*size[0]*size[1]) for _ in self.buffers]
+            self.size = size
+
+        # The oldest frame in the ring is complete by now and can be read without stalling
+        if self.pending[self.buffer_index] is not None:
+            self.__submit(self.buffer_index)
+
+        framebuffer.read_into(self.buffers[self.buffer_index], viewport=viewport, components=3, alignment=1)
+        self.pending[self.buffer_index] = (self.num_frames, size)
+        self.num_frames += 1
+
+        self.buffer_index = (self.buffer_index + 1) % len(self.buffers)
+
+    def release(self):
+        # Must be called from the render thread, the writer finishes in the background (see `join`)
+        self.__flush_buffers()
+
+        for buffer in self.buffers:
+            if buffer is not None:
+                buffer.release()
+
+        self.queue.put(None)
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def __flush_buffers(self):
+        # Submit the pending frames in order
+        for i in range(len(self.buffers)):
+            index = (self.buffer_index + i) % len(self.buffers)
+            if self.pending[index] is not None:
+                self.__submit(index)
+
+    def __submit(self, index):
+        frame_index, size = self.pending[index]
+        self.pending[index] = None
+
+        item = (frame_index, size, self.buffers[index].read(size=3*size[0]*size[1]))
+
+        if self.policy == 'block':
+            self.queue.put(item)
+        else:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self.num_dropped += 1
+
+    def __write_frames(self):
+        while True:
+            item = self.queue.get()
+
+            if item is None:
+                break
+
+            frame_index, size, data = item
+
+            # OpenGL images start with the bottom row
+            image = np.frombuffer(data, dtype=np.uint8).reshape(size[1], size[0], 3)[::-1]
+
+            try:
+                self.writer.write(frame_index, image)
+            except Exception as e:
+                print(f"Exception while writing frame {frame_index}: {e}")
+
+        self.writer.close()
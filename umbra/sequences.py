@@ -0,0 +1,127 @@
+import time
+
+import moderngl
+import numpy as np
+
+class Sequence:
+    # Vertex positions of an animation (T frames of N vertices) played back on the GPU.
+    #
+    # The frames are uploaded once into a single buffer and copied into the vertex buffer of the object
+    # on the GPU when the frame changes (or blended by a compute shader with interpolation).
+    # Sequences larger than `max_resident_bytes` keep a chunk of consecutive frames on the GPU,
+    # which is replaced when the playback leaves it.
+    def __init__(self, context: moderngl.Context, frames: np.ndarray, fps=30, loop=True, interpolation_shader: moderngl.ComputeShader=None, max_resident_bytes=2**30):
+        self.context = context
+        self.fps = fps
+        self.loop = loop
+        self.interpolation_shader = interpolation_shader
+
+        self.num_frames, self.num_vertices = frames.shape[:2]
+        self.frame_bytes = 12*self.num_vertices
+
+        # Chunks overlap by one frame, so consecutive frames can always be interpolated
+        self.chunk_frames = min(self.num_frames, max(2, max_resident_bytes // max(self.frame_bytes, 1)))
+        if self.chunk_frames < self.num_frames:
+            self.frames = frames
+            self.chunk_start = None
+            self.buffer = context.buffer(reserve=self.chunk_frames*self.frame_bytes)
+        else:
+            self.frames = None
+            self.chunk_start = 0
+            self.buffer = context.buffer(np.ascontiguousarray(frames, dtype=np.float32))
+
+        self.is_playing = False
+        self.time = 0.0
+        self.start_time = None
+
+        # Frames (a, b, t) currently in the vertex buffer
+        self.shown = None
+
+    @property
+    def duration(self):
+        return self.num_frames / self.fps
+
+    def play(self):
+        if not self.is_playing:
+            self.is_playing = True
+            self.start_time = time.perf_counter() - self.time
+
+    def pause(self):
+        self.time = self.__current_time()
+        self.is_playing = False
+
+    def seek(self, t):
+        # Time in seconds
+        self.time = t
+        if self.is_playing:
+            self.start_time = time.perf_counter() - t
+
+    def update(self, vbo: moderngl.Buffer):
+        # Write the positions of the current time into the vertex buffer. Returns the number of uploaded bytes.
+        a, b, t = self.__current_frames()
+
+        if self.interpolation_shader is None or t == 0.0:
+            b, t = a, 0.0
+
+        num_uploaded_bytes = 0
+        if self.frames is not None:
+            if b < a:
+                # Interpolating the wrap around would need the last and the first chunk
+                b, t = a, 0.0
+
+            if self.chunk_start is None or not self.chunk_start <= a or not b < self.chunk_start + self.chunk_frames:
+                num_uploaded_bytes = self.__load_chunk(a)
+
+        if (a, b, t) == self.shown:
+            return num_uploaded_bytes
+
+        offset_a = (a - self.chunk_start)*self.frame_bytes
+        offset_b = (b - self.chunk_start)*self.frame_bytes
+
+        if t == 0.0:
+            self.context.copy_buffer(vbo, self.buffer, size=self.frame_bytes, read_offset=offset_a)
+        else:
+            self.buffer.bind_to_storage_buffer(0)
+            vbo.bind_to_storage_buffer(1)
+            self.interpolation_shader['num_values'] = 3*self.num_vertices
+            self.interpolation_shader['offset_a'] = offset_a // 4
+            self.interpolation_shader['offset_b'] = offset_b // 4
+            self.interpolation_shader['t'] = t
+            self.interpolation_shader.run(group_x=(3*self.num_vertices + 255) // 256)
+            self.context.memory_barrier()
+
+        self.shown = (a, b, t)
+
+        return num_uploaded_bytes
+
+    def release(self):
+        self.buffer.release()
+
+    def __current_time(self):
+        if not self.is_playing:
+            return self.time
+        return time.perf_counter() - self.start_time
+
+    def __current_frames(self):
+        # Frame indices a and b and blend factor t at the current time
+        x = max(self.__current_time(), 0.0)*self.fps
+
+        if self.loop:
+            x = x % self.num_frames
+        elif x >= self.num_frames - 1:
+            # Stop at the last frame
+            if self.is_playing:
+                self.time = (self.num_frames - 1) / self.fps
+                self.is_playing = False
+            return self.num_frames - 1, self.num_frames - 1, 0.0
+
+        a = int(x)
+        b = (a + 1) % self.num_frames
+        return a, b, float(x - a)
+
+    def __load_chunk(self, frame):
+        self.chunk_start = min((frame // (self.chunk_frames - 1))*(self.chunk_frames - 1), self.num_frames - self.chunk_frames)
+        chunk = np.ascontiguousarray(self.frames[self.chunk_start:self.chunk_start + self.chunk_frames], dtype=np.float32)
+        self.buffer.orphan()
+        self.buffer.write(chunk)
+        return chunk.nbytes
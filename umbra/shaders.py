@@ -13,18 +13,44 @@ mesh_vertex_shader = '''
                     vec3 color;
                 } vs_out;
 
-                uniform mat4 model_view_matrix;
-                uniform mat4 projection_matrix;
+                // Filled once per frame (see `create_transforms_block`)
+                layout(std140, binding = 0) uniform Transforms
+                {
+                    mat4 view_matrix;
+                    mat4 projection_matrix;
+                    mat4 model_view_matrix;
+                    mat4 normal_matrix;
+                };
+
+                // Filled per object (see `set_object_transform`)
+                layout(std140, binding = 1) uniform ObjectTransform
+                {
+                    mat4 object_matrix;
+                    mat3 object_normal_matrix;
+                    ivec4 object_flags; // x: normal encoding (0: xyz, 1: octahedral)
+                };
+
+                vec3 decode_normal(vec3 normal) {
+                    if (object_flags.x != 1) {
+                        return normal;
+                    }
+
+                    // Octahedral encoding (only xy are set)
+                    vec3 n = vec3(normal.xy, 1.0 - abs(normal.x) - abs(normal.y));
+                    if (n.z < 0) {
+                        n.xy = (1.0 - abs(n.yx)) * vec2(n.x >= 0 ? 1.0 : -1.0, n.y >= 0 ? 1.0 : -1.0);
+                    }
+                    return n;
+                }
 
                 void main() {
                     // Handle position
-                    vs_out.position = position;
-                    vs_out.position_mv = (model_view_matrix * vec4(position, 1)).xyz;
+                    vs_out.position = (object_matrix * vec4(position, 1)).xyz;
+                    vs_out.position_mv = (model_view_matrix * vec4(vs_out.position, 1)).xyz;
 
                     // Handle normal
-                    mat4 normal_model_view_matrix = transpose(inverse(model_view_matrix));
-                    vs_out.normal = normalize(normal);
-                    vs_out.normal_mv = normalize((normal_model_view_matrix * vec4(normal, 1)).xyz);
+                    vs_out.normal = normalize(object_normal_matrix * decode_normal(normal));
+                    vs_out.normal_mv = normalize(mat3(normal_matrix) * vs_out.normal);
 
                     // Handle color
                     vs_out.color = color;
@@ -33,6 +59,105 @@ mesh_vertex_shader = '''
                 }
 '''
 
+mesh_instanced_vertex_shader = '''
+                #version 450
+                in vec3 position;
+                in vec3 normal;
+                in vec3 color;
+
+                // Per instance: transformation, normal matrix and color (alpha = 0 uses the vertex color)
+                in mat4 instance_matrix;
+                in mat3 instance_normal_matrix;
+                in vec4 instance_color;
+
+                out VertexData
+                {
+                    vec3 position;
+                    vec3 normal;
+                    vec3 position_mv;
+                    vec3 normal_mv;
+                    vec3 color;
+                } vs_out;
+
+                layout(std140, binding = 0) uniform Transforms
+                {
+                    mat4 view_matrix;
+                    mat4 projection_matrix;
+                    mat4 model_view_matrix;
+                    mat4 normal_matrix;
+                };
+
+                // Filled per object (see `set_object_transform`)
+                layout(std140, binding = 1) uniform ObjectTransform
+                {
+                    mat4 object_matrix;
+                    mat3 object_normal_matrix;
+                    ivec4 object_flags; // x: normal encoding (0: xyz, 1: octahedral)
+                };
+
+                vec3 decode_normal(vec3 normal) {
+                    if (object_flags.x != 1) {
+                        return normal;
+                    }
+
+                    // Octahedral encoding (only xy are set)
+                    vec3 n = vec3(normal.xy, 1.0 - abs(normal.x) - abs(normal.y));
+                    if (n.z < 0) {
+                        n.xy = (1.0 - abs(n.yx)) * vec2(n.x >= 0 ? 1.0 : -1.0, n.y >= 0 ? 1.0 : -1.0);
+                    }
+                    return n;
+                }
+
+                void main() {
+                    // Handle position
+                    vs_out.position = (object_matrix * instance_matrix * vec4(position, 1)).xyz;
+                    vs_out.position_mv = (model_view_matrix * vec4(vs_out.position, 1)).xyz;
+
+                    // Handle normal
+                    vs_out.normal = normalize(object_normal_matrix * instance_normal_matrix * decode_normal(normal));
+                    vs_out.normal_mv = normalize(mat3(normal_matrix) * vs_out.normal);
+
+                    // Handle color
+                    vs_out.color = mix(color, instance_color.rgb, instance_color.a);
+
+                    gl_Position = projection_matrix * vec4(vs_out.position_mv, 1);
+                }
+'''
+
+coordinate_system_vertex_shader = '''
+                #version 450
+                in vec3 position;
+                in vec3 color;
+
+                out VertexData
+                {
+                    vec3 position;
+                    vec3 normal;
+                    vec3 position_mv;
+                    vec3 normal_mv;
+                    vec3 color;
+                } vs_out;
+
+                layout(std140, binding = 0) uniform Transforms
+                {
+                    mat4 view_matrix;
+                    mat4 projection_matrix;
+                    mat4 model_view_matrix;
+                    mat4 normal_matrix;
+                };
+
+                void main() {
+                    // The coordinate system is not affected by the model matrix
+                    vs_out.position = position;
+                    vs_out.position_mv = (view_matrix * vec4(position, 1)).xyz;
+                    vs_out.normal = vec3(0, 0, 1);
+                    vs_out.normal_mv = vec3(0, 0, 1);
+                    vs_out.color = color;
+
+                    gl_Position = projection_matrix * vec4(vs_out.position_mv, 1);
+                }
+'''
+
 mesh_wireframe_geometry_shader = '''
 #version 450
 layout (triangles) in;
@@ -158,6 +283,50 @@ fragment_shader_flat = '''
                 }
 '''
 
+fragment_shader_edges = '''
+                #version 450
+
+                in VertexData
+                {
+                    vec3 position;
+                    vec3 normal;
+                    vec3 position_mv;
+                    vec3 normal_mv;
+                    vec3 color;
+                } fs_in;  
+
+                out vec4 color;
+
+                void main() {
+                    // Same color and depth offset as the wireframe geometry shader, so edges are drawn on top of the faces
+                    color = vec4(0.5*fs_in.color, 1.0);
+                    gl_FragDepth = 0.9999*(gl_FragCoord.z - 0.5) + 0.5;
+                }
+'''
+
+fragment_shader_pick = '''
+                #version 450
+
+                in VertexData
+                {
+                    vec3 position;
+                    vec3 normal;
+                    vec3 position_mv;
+                    vec3 normal_mv;
+                    vec3 color;
+                } fs_in;  
+
+                // Object identifier (0 is the background)
+                uniform uint object_id;
+
+                out uvec2 id;
+
+                void main() {
+                    // Index of the face, point or line within the draw call
+                    id = uvec2(object_id, uint(gl_PrimitiveID));
+                }
+'''
+
 fragment_shader_position_normal = '''
                 #version 450
 
@@ -177,4 +346,31 @@ fragment_shader_position_normal = '''
                     position = fs_in.position;
                     normal = fs_in.normal;
                 }
-'''
\ No newline at end of file
+'''
+
+sequence_interpolation_compute_shader = '''
+#version 450
+layout (local_size_x = 256) in;
+
+layout (std430, binding = 0) readonly buffer Frames
+{
+    float frames[];
+};
+
+layout (std430, binding = 1) writeonly buffer Positions
+{
+    float positions[];
+};
+
+uniform uint num_values;
+uniform uint offset_a;
+uniform uint offset_b;
+uniform float t;
+
+void main() {
+    uint i = gl_GlobalInvocationID.x;
+    if (i < num_values) {
+        positions[i] = mix(frames[offset_a + i], frames[offset_b + i], t);
+    }
+}
+'''
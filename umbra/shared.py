@@ -0,0 +1,188 @@
+from multiprocessing import shared_memory
+import sys
+
+import numpy as np
+
+class SharedGeometryHandle:
+    # Picklable description of a shared geometry channel that can be passed to producer processes (see `open`)
+    object_types = ['points', 'mesh']
+
+    def __init__(self, shm_name, object_name, object_type, max_vertices, max_faces=0, normals=False, colors=True, num_slots=3):
+        if object_type not in SharedGeometryHandle.object_types:
+            raise RuntimeError(f"Unknown object type '{object_type}' of shared channel, expected one of {SharedGeometryHandle.object_types}.")
+
+        if num_slots < 2:
+            raise RuntimeError(f"Shared channels need at least 2 slots, got {num_slots}.")
+
+        self.shm_name = shm_name
+        self.object_name = object_name
+        self.object_type = object_type
+        self.max_vertices = max_vertices
+        self.max_faces = max_faces if object_type == 'mesh' else 0
+        self.normals = normals
+        self.colors = colors
+        self.num_slots = num_slots
+
+    def open(self):
+        # Open the channel in the producer process
+        return SharedGeometryProducer(self)
+
+class _SharedGeometry:
+    # Shared memory segment with a header and `num_slots` slots of vertex data.
+    #
+    # Header (int64): [frame, latest slot, reader slot, unused] followed by [sequence, vertices, faces, attributes] per slot.
+    # Each slot has a sequence number (seqlock): it is odd while the producer writes the slot and changes with every write,
+    # so the reader can detect a slot that was overwritten while it was being uploaded.
+    def __init__(self, handle: SharedGeometryHandle, create=False):
+        self.handle = handle
+
+        # Arrays of a slot: name -> (shape, dtype)
+        self.arrays = {'v': ((handle.max_vertices, 3), np.float32)}
+        if handle.normals:
+            self.arrays['n'] = ((handle.max_vertices, 3), np.float32)
+        if handle.colors:
+            self.arrays['c'] = ((handle.max_vertices, 3), np.float32)
+        if handle.max_faces > 0:
+            self.arrays['f'] = ((handle.max_faces, 3), np.int32)
+
+        header_size = 64*((8*(4 + 4*handle.num_slots) + 63) // 64)
+        slot_size = sum(int(np.prod(shape))*np.dtype(dtype).itemsize for shape, dtype in self.arrays.values())
+        size = header_size + handle.num_slots*slot_size
+
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            handle.shm_name = self.shm.name
+        elif sys.version_info >= (3, 13):
+            # The segment is owned (and unlinked) by the viewer
+            self.shm = shared_memory.SharedMemory(name=handle.shm_name, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name=handle.shm_name)
+
+        self.header = np.ndarray((4 + 4*handle.num_slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.slot_header = self.header[4:].reshape(handle.num_slots, 4)
+
+        # Views of the slot arrays
+        self.slots = []
+        for slot in range(handle.num_slots):
+            offset = header_size + slot*slot_size
+            views = {}
+            for name, (shape, dtype) in self.arrays.items():
+                views[name] = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+                offset += views[name].nbytes
+            self.slots.append(views)
+
+        if create:
+            self.header[:] = 0
+            self.header[1:3] = -1
+
+    def close(self):
+        # Views must be released before the segment can be closed
+        self.header = None
+        self.slot_header = None
+        self.slots = []
+        self.shm.close()
+
+class SharedGeometryProducer(_SharedGeometry):
+    # Writes geometry into a shared geometry channel (usually from another process).
+    # Slots are written round robin, skipping the newest slot and the slot that is read by the viewer
+    # (if there is no other slot, the newest slot is overwritten).
+    def __init__(self, handle: SharedGeometryHandle):
+        super().__init__(handle, create=False)
+
+    def write(self, v, f=None, n=None, c=None):
+        # Publish new geometry and return its frame number
+        v = np.asarray(v, dtype=np.float32).reshape(-1, 3)
+
+        if len(v) > self.handle.max_vertices:
+            raise RuntimeError(f"Shared channel of '{self.handle.object_name}' has space for {self.handle.max_vertices} vertices, got {len(v)}.")
+
+        if (f is not None) != (self.handle.object_type == 'mesh'):
+            raise RuntimeError(f"Faces must be passed if and only if the shared channel of '{self.handle.object_name}' is a mesh.")
+
+        if f is not None and len(f) > self.handle.max_faces:
+            raise RuntimeError(f"Shared channel of '{self.handle.object_name}' has space for {self.handle.max_faces} faces, got {len(f)}.")
+
+        if (n is not None and not self.handle.normals) or (c is not None and not self.handle.colors):
+            raise RuntimeError(f"Shared channel of '{self.handle.object_name}' was created without normals or colors.")
+
+        latest, reader = self.header[1], self.header[2]
+        free_slots = [s for s in range(self.handle.num_slots) if s != latest and s != reader]
+
+        # With 2 slots (double buffering), the newest slot is overwritten if the viewer reads the other one.
+        # A read that overlaps the write is detected by the sequence number of the slot.
+        slot = free_slots[0] if len(free_slots) > 0 else int(latest)
+
+        views = self.slots[slot]
+
+        # Odd sequence number while writing
+        self.slot_header[slot, 0] += 1
+
+        views['v'][:len(v)] = v
+        if n is not None:
+            views['n'][:len(v)] = np.asarray(n, dtype=np.float32).reshape(-1, 3)
+        if c is not None:
+            views['c'][:len(v)] = np.asarray(c, dtype=np.float32).reshape(-1, 3) if np.ndim(c) > 1 else np.asarray(c, dtype=np.float32)[None, :]
+        if f is not None:
+            f = np.asarray(f, dtype=np.int32).reshape(-1, 3)
+            views['f'][:len(f)] = f
+
+        self.slot_header[slot, 1] = len(v)
+        self.slot_header[slot, 2] = 0 if f is None else len(f)
+        self.slot_header[slot, 3] = (1 if n is not None else 0) | (2 if c is not None else 0)
+        self.slot_header[slot, 0] += 1
+
+        # Publish the slot
+        self.header[1] = slot
+        self.header[0] += 1
+
+        return int(self.header[0])
+
+class SharedGeometryChannel(_SharedGeometry):
+    # Viewer side of a shared geometry channel, owns the shared memory segment
+    def __init__(self, object_name, object_type, max_vertices, max_faces=0, normals=False, colors=True, num_slots=3):
+        super().__init__(SharedGeometryHandle(None, object_name, object_type, max_vertices, max_faces, normals, colors, num_slots), create=True)
+        self.frame = 0
+
+    def acquire(self):
+        # Claim the newest complete slot. Returns (slot, sequence number, frame) or None if there is nothing new.
+        frame = int(self.header[0])
+        if frame == self.frame:
+            return None
+
+        slot = int(self.header[1])
+        self.header[2] = slot
+
+        # The producer could have published another slot before the claim
+        if slot != self.header[1]:
+            return None
+
+        sequence = int(self.slot_header[slot, 0])
+        if sequence % 2 == 1:
+            return None
+
+        return slot, sequence, frame
+
+    def views(self, slot):
+        # Views of the valid data of a slot (without copying)
+        num_vertices, num_faces, attributes = self.slot_header[slot, 1:]
+        slot_views = self.slots[slot]
+
+        views = {
+            'v': slot_views['v'][:num_vertices],
+            'n': slot_views['n'][:num_vertices] if attributes & 1 else None,
+            'c': slot_views['c'][:num_vertices] if attributes & 2 else None,
+            'f': slot_views['f'][:num_faces] if 'f' in slot_views else None
+        }
+        return views
+
+    def release(self, slot, sequence, frame):
+        # Returns False if the slot was overwritten while it was read
+        if self.slot_header[slot, 0] != sequence:
+            return False
+
+        self.frame = frame
+        return True
+
+    def close(self):
+        super().close()
+        self.shm.unlink()
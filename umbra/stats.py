@@ -0,0 +1,61 @@
+from collections import deque
+import threading
+
+import moderngl
+import numpy as np
+
+class FrameStatistics:
+    # Rolling window of per-frame measurements (e.g. phase timings in milliseconds or counters).
+    # Measurements are recorded by the render thread and can be summarized from any thread.
+    def __init__(self, window_size=300):
+        self.window_size = window_size
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, values: dict):
+        with self._lock:
+            for name, value in values.items():
+                if not name in self._samples:
+                    self._samples[name] = deque(maxlen=self.window_size)
+                self._samples[name].append(value)
+
+    def summary(self, percentiles=(50, 95, 99)):
+        with self._lock:
+            samples = {name: np.array(values, dtype=np.float64) for name, values in self._samples.items() if len(values) > 0}
+
+        summary = {}
+        for name, values in samples.items():
+            summary[name] = {
+                'last': float(values[-1]),
+                'mean': float(values.mean()),
+                'max': float(values.max()),
+                **{f'p{p}': float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+            }
+
+        return summary
+
+class GpuTimer:
+    # Measures GPU time with a ring of timer queries.
+    # A query is only read when it is reused, so reading the result does not stall the pipeline.
+    def __init__(self, context: moderngl.Context, num_queries=3):
+        self.queries = [context.query(time=True) for _ in range(num_queries)]
+        self.pending = [False]*num_queries
+        self.index = 0
+
+        # GPU time (in milliseconds) of the most recent completed measurement
+        self.elapsed = None
+
+    def __enter__(self):
+        if self.pending[self.index]:
+            # The result is a 32-bit value in nanoseconds, some drivers report all bits set for invalid results
+            elapsed = self.queries[self.index].elapsed
+            if elapsed != 0xFFFFFFFF:
+                self.elapsed = elapsed / 1e6
+
+        self.queries[self.index].__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.queries[self.index].__exit__(*args)
+        self.pending[self.index] = True
+        self.index = (self.index + 1) % len(self.queries)
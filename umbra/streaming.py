@@ -0,0 +1,239 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Message header: magic, protocol version, message type, flags, sequence number,
+# length of the JSON metadata and length of the (optionally compressed) array payload
+_header = struct.Struct('<4sBBH Q I Q')
+_magic = b'UMBR'
+_version = 1
+
+_message_types = ['set_points', 'set_mesh', 'set_lines', 'remove_object']
+
+# Arrays that messages of each type must carry
+_message_arrays = {'set_points': ['v'], 'set_mesh': ['v', 'f'], 'set_lines': ['start', 'end'], 'remove_object': []}
+
+_flag_compressed = 1
+
+# Parameters that clients may set per message type (other viewer arguments cannot be set remotely)
+_message_parameters = {'set_points': ['point_size']}
+
+# The metadata is small, larger sizes are rejected before anything is allocated
+_max_metadata_size = 2**20
+
+def encode_message(message_type, object_name, sequence, arrays={}, parameters={}, compression_level=0):
+    # Encode a message as header, JSON metadata (object name, parameters and array layout) and raw array data
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items() if a is not None}
+
+    metadata = {
+        'object_name': object_name,
+        'parameters': parameters,
+        'arrays': [{'name': name, 'dtype': np.lib.format.dtype_to_descr(a.dtype), 'shape': a.shape} for name, a in arrays.items()]
+    }
+    metadata = json.dumps(metadata).encode('utf-8')
+
+    # Without compression, the payload references the array data
+    payload = [memoryview(a).cast('B') for a in arrays.values()]
+
+    flags = 0
+    if compression_level > 0:
+        payload = [zlib.compress(b''.join(payload), compression_level)]
+        flags |= _flag_compressed
+
+    header = _header.pack(_magic, _version, _message_types.index(message_type), flags, sequence, len(metadata), sum(len(p) for p in payload))
+
+    return [header + metadata, *payload]
+
+def read_message(stream, max_payload_size=2**30):
+    # Read a message from a binary stream. Returns (message type, object name, sequence, arrays, parameters) or None at the end of the stream.
+    # Malformed messages raise a RuntimeError or ValueError, after which the stream cannot be read further.
+    header = stream.read(_header.size)
+    if len(header) < _header.size:
+        return None
+
+    magic, version, message_type, flags, sequence, metadata_size, payload_size = _header.unpack(header)
+
+    if magic != _magic or version != _version:
+        raise RuntimeError(f"Invalid stream message (magic {magic}, version {version}).")
+
+    if message_type >= len(_message_types):
+        raise RuntimeError(f"Unknown stream message type {message_type}.")
+
+    if metadata_size > _max_metadata_size or payload_size > max_payload_size:
+        raise RuntimeError(f"Stream message with {metadata_size} bytes of metadata and {payload_size} bytes of payload exceeds the limits ({_max_metadata_size} and {max_payload_size} bytes).")
+
+    metadata = stream.read(metadata_size)
+    payload = stream.read(payload_size)
+
+    if len(metadata) < metadata_size or len(payload) < payload_size:
+        return None
+
+    if flags & _flag_compressed:
+        # The decompressed size is limited as well
+        decompressor = zlib.decompressobj()
+        payload = decompressor.decompress(payload, max_payload_size)
+        if decompressor.unconsumed_tail:
+            raise RuntimeError(f"Decompressed stream message exceeds the limit of {max_payload_size} bytes.")
+
+    try:
+        metadata = json.loads(metadata.decode('utf-8'))
+        object_name, parameters = metadata['object_name'], metadata['parameters']
+
+        # The arrays are views of the payload
+        arrays = {}
+        offset = 0
+        for array in metadata['arrays']:
+            dtype = np.lib.format.descr_to_dtype(array['dtype'])
+            count = int(np.prod(array['shape']))
+            arrays[array['name']] = np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(array['shape'])
+            offset += count*dtype.itemsize
+    except (KeyError, TypeError) as e:
+        raise RuntimeError(f"Invalid stream message metadata ({e!r}).")
+
+    return _message_types[message_type], object_name, sequence, arrays, parameters
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                message = read_message(self.rfile, self.server.streaming_server.max_message_size)
+            except (RuntimeError, ValueError, zlib.error) as e:
+                print(f"Closing stream connection: {e}")
+                break
+
+            if message is None:
+                break
+
+            self.server.streaming_server.dispatch(*message)
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+class StreamingServer:
+    # Receives geometry updates from clients (see `StreamingClient`) over TCP or Unix domain sockets
+    # and forwards them to the viewer. Every connection is handled by a separate thread.
+    #
+    # Messages carry a sequence number per object. Messages that are older than the last message
+    # of the same object (e.g. from a slower producer) are skipped. Messages with invalid contents are
+    # ignored, connections that send malformed or larger messages than `max_message_size` bytes are closed.
+    def __init__(self, viewer, address=('127.0.0.1', 0), max_message_size=2**30):
+        self.viewer = viewer
+        self.max_message_size = max_message_size
+
+        if isinstance(address, str):
+            self.server = _UnixServer(address, _StreamHandler)
+        else:
+            self.server = _TCPServer(tuple(address), _StreamHandler)
+        self.server.streaming_server = self
+
+        self.lock = threading.Lock()
+        self.sequences = {}
+        self.num_messages = 0
+        self.num_stale = 0
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self):
+        # The bound address (e.g. with the actual port if port 0 was requested)
+        return self.server.server_address
+
+    def dispatch(self, message_type, object_name, sequence, arrays, parameters):
+        if not isinstance(parameters, dict) or any(name not in _message_parameters.get(message_type, []) for name in parameters):
+            print(f"Ignoring '{message_type}' message for '{object_name}' with unsupported parameters {parameters}.")
+            return
+
+        if not isinstance(object_name, str):
+            print(f"Ignoring '{message_type}' message with invalid object name {object_name!r}.")
+            return
+
+        missing = [name for name in _message_arrays[message_type] if name not in arrays]
+        if len(missing) > 0:
+            print(f"Ignoring '{message_type}' message for '{object_name}' without the arrays {missing}.")
+            return
+
+        with self.lock:
+            self.num_messages += 1
+            if sequence <= self.sequences.get(object_name, -1):
+                self.num_stale += 1
+                return
+            self.sequences[object_name] = sequence
+
+        if message_type == 'set_points':
+            self.viewer.set_points(arrays['v'], n=arrays.get('n', None), c=arrays.get('c', None), point_size=parameters.get('point_size', 5), object_name=object_name)
+        elif message_type == 'set_mesh':
+            self.viewer.set_mesh(arrays['v'], arrays['f'], n=arrays.get('n', None), c=arrays.get('c', None), object_name=object_name)
+        elif message_type == 'set_lines':
+            self.viewer.set_lines(arrays['start'], arrays['end'], c=arrays.get('c', None), object_name=object_name)
+        elif message_type == 'remove_object':
+            self.viewer.remove_object(object_name)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+        # Unix domain sockets leave a file behind
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+class StreamingClient:
+    # Sends geometry to a `StreamingServer` with the same calls as `MeshViewer`.
+    #
+    # Sequence numbers default to nanosecond timestamps, so they also increase across
+    # clients and restarted clients on the same host.
+    def __init__(self, address, compression_level=0):
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(address)
+        else:
+            self.socket = socket.create_connection(tuple(address))
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.compression_level = compression_level
+        self.sequences = {}
+        self.lock = threading.Lock()
+
+    def set_points(self, v, n=None, c=None, point_size=5, object_name='default', sequence=None):
+        self.__send('set_points', object_name, sequence, {'v': v, 'n': n, 'c': c}, {'point_size': point_size})
+
+    def set_mesh(self, v, f, n=None, c=None, object_name='default', sequence=None):
+        self.__send('set_mesh', object_name, sequence, {'v': v, 'f': f, 'n': n, 'c': c})
+
+    def set_lines(self, start, end, c=None, object_name='default', sequence=None):
+        self.__send('set_lines', object_name, sequence, {'start': start, 'end': end, 'c': c})
+
+    def remove_object(self, object_name, sequence=None):
+        self.__send('remove_object', object_name, sequence)
+
+    def close(self):
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __send(self, message_type, object_name, sequence, arrays={}, parameters={}):
+        arrays = {name: np.asarray(a) for name, a in arrays.items() if a is not None}
+
+        with self.lock:
+            if sequence is None:
+                sequence = max(time.time_ns(), self.sequences.get(object_name, 0) + 1)
+            self.sequences[object_name] = sequence
+
+            for data in encode_message(message_type, object_name, sequence, arrays, parameters, self.compression_level):
+                self.socket.sendall(data)
@@ -5,3 +5,151 @@ def ray_plane_intersection(p0, n, l0, l):
 
 def to_opengl_matrix(A: np.ndarray):
     return np.ascontiguousarray(A.T).astype(np.float32)
+
+def create_transforms_block(view_matrix: np.ndarray, projection_matrix: np.ndarray, model_matrix: np.ndarray):
+    # Data of the `Transforms` uniform block (std140 layout) shared by all programs
+    model_view_matrix = view_matrix @ model_matrix
+
+    # The normal matrix is the inverse transpose of the upper 3x3 part (stored as mat4)
+    normal_matrix = np.eye(4)
+    normal_matrix[:3, :3] = np.linalg.inv(model_view_matrix[:3, :3]).T
+
+    return np.concatenate([to_opengl_matrix(M).ravel() for M in [view_matrix, projection_matrix, model_view_matrix, normal_matrix]])
+
+def create_object_block(object_matrix: np.ndarray, normal_encoding=0):
+    # Data of the `ObjectTransform` uniform block (std140 layout): object matrix, normal matrix and flags.
+    # The normal matrix is computed like the one of instances (see `create_instance_data`),
+    # a mat3 is stored as three columns padded to vec4.
+    instance_data = create_instance_data(object_matrix)[0]
+
+    block = np.zeros(32, dtype=np.float32)
+    block[:16] = instance_data[:16]
+    block[16:28].reshape(3, 4)[:, :3] = instance_data[16:].reshape(3, 3)
+    block[28:].view(np.int32)[0] = normal_encoding
+    return block
+
+def create_instance_data(transforms: np.ndarray):
+    # Per-instance attributes (column-major): transformation matrix (16 floats) and normal matrix (9 floats).
+    # The normal matrix is the cofactor matrix of the upper 3x3 part, which is the inverse transpose up to scale
+    # (the normals are normalized in the shader) and also exists for degenerate transformations (e.g. scale 0).
+    transforms = np.asarray(transforms, dtype=np.float32).reshape(-1, 4, 4)
+
+    a, b, c = transforms[:, :3, 0], transforms[:, :3, 1], transforms[:, :3, 2]
+    cofactors = np.stack([np.cross(b, c), np.cross(c, a), np.cross(a, b)], axis=2)
+
+    # Keep the orientation of normals for mirroring transformations
+    det = np.einsum('ij,ij->i', a, cofactors[:, :, 0])
+    cofactors *= np.where(det < 0, -1, 1)[:, None, None]
+
+    return np.concatenate([transforms.transpose(0, 2, 1).reshape(-1, 16), cofactors.transpose(0, 2, 1).reshape(-1, 9)], axis=1).astype(np.float32)
+
+
+def to_numpy(a):
+    # Wrap buffer protocol objects and DLPack exporters (e.g. CPU tensors) without copying
+    if isinstance(a, np.ndarray):
+        return a
+
+    if hasattr(a, '__dlpack__') and hasattr(np, 'from_dlpack'):
+        try:
+            return np.from_dlpack(a)
+        except (TypeError, ValueError, RuntimeError, BufferError):
+            pass
+
+    return np.asarray(a)
+
+def as_contiguous_array(a, dtype=None):
+    # Only copies if the data is not contiguous or does not have the requested type
+    return np.ascontiguousarray(to_numpy(a), dtype=dtype)
+
+_vertex_attribute_formats = {
+    'f4': 'f',
+    'f2': 'f2',
+    'u1': 'f1', # Normalized unsigned bytes
+}
+
+def create_vertex_format(dtype: np.dtype, attributes):
+    # Create the moderngl buffer format for the fields of a structured (interleaved) vertex type.
+    # Fields that are not in `attributes` are skipped.
+    formats = []
+    names = []
+    position = 0
+
+    for name, (field_dtype, offset) in sorted(((name, dtype.fields[name][:2]) for name in dtype.names), key=lambda f: f[1][1]):
+        if offset > position:
+            formats.append(f'{offset - position}x')
+
+        if name in attributes:
+            base = field_dtype.base
+            if base.str[1:] not in _vertex_attribute_formats or base.byteorder == '>':
+                raise RuntimeError(f"Unsupported type '{base}' of vertex attribute '{name}'.")
+
+            formats.append(f'{int(np.prod(field_dtype.shape))}{_vertex_attribute_formats[base.str[1:]]}')
+            names.append(name)
+        else:
+            formats.append(f'{field_dtype.itemsize}x')
+
+        position = offset + field_dtype.itemsize
+
+    if dtype.itemsize > position:
+        formats.append(f'{dtype.itemsize - position}x')
+
+    return ' '.join(formats), names
+
+# Per-object formats of separate vertex attributes and their moderngl buffer formats.
+# Half-float positions and normals are padded to 8 bytes, octahedral normals are decoded in the vertex shader.
+_compact_vertex_formats = {
+    'position': {'f4': '3f', 'f2': '3f2 2x'},
+    'normal': {'f4': '3f', 'f2': '3f2 2x', 'oct': '2f2'},
+    'color': {'f4': '3f', 'u1': '4f1'},
+}
+
+def check_vertex_format(vertex_format=None):
+    # Complete a vertex format (e.g. {'position': 'f2', 'color': 'u1'}) with the defaults (float32)
+    vertex_format = dict(vertex_format or {})
+
+    for attribute, format in vertex_format.items():
+        if attribute not in _compact_vertex_formats:
+            raise RuntimeError(f"Unknown vertex attribute '{attribute}', expected one of {list(_compact_vertex_formats.keys())}.")
+        if format not in _compact_vertex_formats[attribute]:
+            raise RuntimeError(f"Unsupported format '{format}' of vertex attribute '{attribute}', expected one of {list(_compact_vertex_formats[attribute].keys())}.")
+
+    return {attribute: vertex_format.get(attribute, 'f4') for attribute in _compact_vertex_formats}
+
+def get_buffer_format(vertex_format, attribute):
+    return _compact_vertex_formats[attribute][vertex_format[attribute]]
+
+def encode_octahedral(n: np.ndarray):
+    # Map unit vectors to the octahedron and unfold it onto the square [-1,1]^2
+    n = n / np.maximum(np.abs(n).sum(axis=1, keepdims=True), 1e-12)
+    encoded = n[:, :2].copy()
+
+    lower = n[:, 2] < 0
+    xy = encoded[lower]
+    encoded[lower] = (1 - np.abs(xy[:, ::-1])) * np.where(xy >= 0, 1, -1)
+
+    return encoded
+
+def encode_vertex_attribute(a, attribute, format):
+    # Flat array of a vertex attribute (N,3) in a format of `check_vertex_format`
+    if format == 'f4':
+        return as_contiguous_array(a, 'f4').reshape(-1)
+
+    a = to_numpy(a)
+
+    # Flat arrays (3N,) are accepted as with 'f4'
+    if a.ndim == 1:
+        a = a.reshape(-1, 3)
+
+    if format == 'f2':
+        encoded = np.zeros((len(a), 4), dtype=np.float16)
+        encoded[:, :3] = a
+    elif format == 'oct':
+        encoded = encode_octahedral(np.asarray(a, dtype=np.float32)).astype(np.float16)
+    elif format == 'u1':
+        # Colors (RGB or RGBA) in [0, 1] or as bytes
+        if a.dtype != np.uint8:
+            a = np.clip(np.round(255*np.asarray(a, dtype=np.float32)), 0, 255).astype(np.uint8)
+        encoded = np.full((len(a), 4), 255, dtype=np.uint8)
+        encoded[:, :a.shape[1]] = a
+
+    return encoded.reshape(-1)
@@ -1,24 +1,73 @@
-import imgui
-from imgui.integrations.glfw import GlfwRenderer
-import glfw
-from queue import Queue
-import OpenGL.GL
+from concurrent.futures import Future
 import moderngl
 import numpy as np
 import threading
+import time
 
+from .batching import Batch
 from .camera import PerspectiveCamera
+from .commands import CommandQueue
 from .controller import OrbitControl
+from .geometry import compute_bounding_box, merge_bounding_boxes, transform_bounding_boxes, intersect_frustum, VertexNormals, compute_unique_edges
+from .lod import PointOctree, LodPointCloud
 from .primitives import Quad, CoordinateSystem
+from .programs import LazyPrograms, configure_shader_cache
+from .recording import FrameRecorder
+from .sequences import Sequence
+from .shared import SharedGeometryChannel
+from .stats import FrameStatistics, GpuTimer
+from .streaming import StreamingServer
 from .shaders import *
-from .utils import to_opengl_matrix
+from .utils import to_opengl_matrix, create_transforms_block, create_object_block, create_instance_data, to_numpy, as_contiguous_array, create_vertex_format
+from .utils import check_vertex_format, get_buffer_format, encode_vertex_attribute
+
+# Window and GUI modules are only imported if a window is created (see `_import_window_modules`)
+imgui = None
+GlfwRenderer = None
+glfw = None
+OpenGL = None
+
+def _import_window_modules():
+    global imgui, GlfwRenderer, glfw, OpenGL
+
+    if glfw is None:
+        import imgui
+        from imgui.integrations.glfw import GlfwRenderer
+        import glfw
+        import OpenGL.GL
 
 class MeshViewer:
-    def __init__(self, width=600, height=600, name="OpenGL Window"):
+    render_policies = ['continuous', 'capped', 'on_demand']
+
+    def __init__(self, width=600, height=600, name="OpenGL Window", coalesce_updates=True, headless=False, render_policy='continuous', max_fps=60, batching=False, batch_max_vertices=10000, shader_cache_dir=None, command_queue_size=0, command_queue_policy='block'):
         self.width = width
         self.height = height
         self.name = name
-        self.command_queue = Queue()
+
+        # Render offscreen without window (e.g. on machines without display)
+        self.headless = headless
+        self.should_close = False
+
+        if not headless:
+            _import_window_modules()
+
+        # Compiled programs are cached on disk by the driver
+        if shader_cache_dir is not None:
+            configure_shader_cache(shader_cache_dir)
+
+        # The render loop redraws continuously, at most `max_fps` times per second ('capped')
+        # or only if something changed ('on_demand')
+        self.window = None
+        self.set_render_policy(render_policy, max_fps)
+        self.on_demand_timeout = 0.5
+        self.redraw_requested = True
+        self.redraw_frames = 0
+        self.camera_version = None
+        self.last_frame_time = 0.0
+
+        # Pending geometry updates of the same object are coalesced (latest wins).
+        # With a size > 0, producers are held back (or updates are dropped) if the render thread falls behind.
+        self.command_queue = CommandQueue(coalesce=coalesce_updates, maxsize=command_queue_size, policy=command_queue_policy)
         self.clear_color = [1, 1, 1]
 
         self.drag_point_left = None
@@ -34,17 +83,76 @@ class MeshViewer:
         self.buffers_all = {}
         self.vaos_all = {}
 
+        # Buffers are updated in place and only reallocated (with this growth factor) if the data does not fit
+        self.buffer_growth_factor = 2.0
+
+        # Rolling per-frame statistics (see `stats`) and GUI overlay
+        self.statistics = FrameStatistics()
+        self.show_stats_overlay = False
+        self.frame_upload_bytes = 0
+        self.frame_draw_calls = 0
+
+        # Small point clouds and line sets (with default material) can share buffers and draw calls
+        self.batching = batching
+        self.batch_max_vertices = batch_max_vertices
+        self.batches = {}
+
+        # Shared memory channels of producer processes by object name (see `create_shared_channel`)
+        self.shared_channels = {}
+
+        # Server for updates from other processes over sockets (see `start_streaming_server`)
+        self.streaming_server = None
+
+        # Objects outside of the view frustum are not drawn
+        self.frustum_culling = True
+        self.num_culled = 0
+
         self.is_open = True
 
-        self.render_thread = threading.Thread(target=self.run)
+        # Resolved when the render loop has exited (running, so it cannot be cancelled by waiting code)
+        self.closed_future = Future()
+        self.closed_future.set_running_or_notify_cancel()
+
+        # Without window, nothing keeps the user from exiting the interpreter
+        self.render_thread = threading.Thread(target=self.run, daemon=headless)
         self.render_thread.start()
 
     def run(self):
-        self.create_window()
+        # The viewer is closed even if the render loop fails (e.g. if no OpenGL context can be created),
+        # so pending and later commands do not wait forever
+        exception = None
+        try:
+            self.__run()
+        except BaseException as e:
+            exception = e
+            raise
+        finally:
+            for channel in self.shared_channels.values():
+                channel.close()
+            self.shared_channels = {}
+
+            self.stop_streaming_server()
+
+            # Commands that were not executed are cancelled
+            self.command_queue.close()
+
+            self.is_open = False
+            if exception is None:
+                self.closed_future.set_result(None)
+            else:
+                self.closed_future.set_exception(exception)
 
-        # Initialize imgui
-        imgui.create_context()
-        self.imgui_renderer = GlfwRenderer(self.window, attach_callbacks=False)
+    def __run(self):
+        if self.headless:
+            self.create_offscreen_context()
+        else:
+            self.create_window()
+
+            # Initialize imgui
+            imgui.create_context()
+            self.imgui_renderer = GlfwRenderer(self.window, attach_callbacks=False)
+
+        self.context_info = {key: self.context.info[key] for key in ['GL_VENDOR', 'GL_RENDERER', 'GL_VERSION']}
 
         # Create the camera and its controller
         self.viewport = (0, 0, self.width, self.height)
@@ -56,66 +164,311 @@ class MeshViewer:
 
         self.coordinate_system = CoordinateSystem(self.context)
 
-        # Create the default program for triangle mesh rendering
-        self.program_name_default = 'face'
-        self.programs_default = {
-            'face': self.context.program(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_color_face),
-            'smooth': self.context.program(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_color_smooth),
-            'normal': self.context.program(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_normal),
-            'flat': self.context.program(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_flat),
-            'wireframe': self.context.program(vertex_shader=mesh_vertex_shader, geometry_shader=mesh_wireframe_geometry_shader, fragment_shader=fragment_shader_flat),
-        }
+        # Uniform buffer with the camera and model transformations, updated once per frame
+        self.transforms_buffer = self.context.buffer(reserve=4*64)
 
-        while not glfw.window_should_close(self.window):
-            glfw.poll_events()
-            self.imgui_renderer.process_inputs()
-            glfw.make_context_current(self.window)
-
-            # Execute all queued commands
-            while not self.command_queue.empty():
-                try:
-                    command = self.command_queue.get_nowait()
-                    command()
-                except RuntimeError as e:
-                    print(e)
-
-            self.context.enable(moderngl.DEPTH_TEST | moderngl.CULL_FACE)
-            self.context.clear(*self.clear_color)
-
-            # Update shader data
-            model_view_matrix = self.camera.view_matrix @ self.model_matrix
-
-            for _, (mode, configure_func, vaos) in self.vaos_all.items():
-                configure_func(self.context)
-                for v in vaos:
-                    v.program['model_view_matrix'].write(to_opengl_matrix(model_view_matrix))
-                    v.program['projection_matrix'].write(to_opengl_matrix(self.camera.projection_matrix))
-                    v.render(mode=mode)
+        # Uniform buffer of objects without own transformation (see `set_object_transform`) and compact normals
+        self.default_object_buffer = self.context.buffer(create_object_block(np.eye(4)))
 
-            # Render the coordinate system 
-            self.coordinate_system.render(self.context, self.camera)
-
-            # Render the GUI
-            imgui.new_frame()
-
-            if self.user_gui_callback:
-                # TODO: Implement error handling!
-                try:
-                    self.user_gui_callback(self)
-                except RuntimeError as e:
-                    print(f"Exception in GUI callback: {e}")
-
-            imgui.render()
-            self.imgui_renderer.render(imgui.get_draw_data())
+        # Create the default program for triangle mesh rendering (programs are compiled on first use)
+        self.program_name_default = 'face'
+        self.programs_default = LazyPrograms(self.context, {
+            'face': dict(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_color_face),
+            'smooth': dict(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_color_smooth),
+            'normal': dict(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_normal),
+            'flat': dict(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_flat),
+            'wireframe': dict(vertex_shader=mesh_vertex_shader, geometry_shader=mesh_wireframe_geometry_shader, fragment_shader=fragment_shader_flat),
+            'edges': dict(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_edges),
+            'pick': dict(vertex_shader=mesh_vertex_shader, fragment_shader=fragment_shader_pick),
+        })
+
+        # The same materials for instanced objects
+        self.programs_instanced = LazyPrograms(self.context, {
+            'face': dict(vertex_shader=mesh_instanced_vertex_shader, fragment_shader=fragment_shader_color_face),
+            'smooth': dict(vertex_shader=mesh_instanced_vertex_shader, fragment_shader=fragment_shader_color_smooth),
+            'normal': dict(vertex_shader=mesh_instanced_vertex_shader, fragment_shader=fragment_shader_normal),
+            'flat': dict(vertex_shader=mesh_instanced_vertex_shader, fragment_shader=fragment_shader_flat),
+            'wireframe': dict(vertex_shader=mesh_instanced_vertex_shader, geometry_shader=mesh_wireframe_geometry_shader, fragment_shader=fragment_shader_flat),
+            'edges': dict(vertex_shader=mesh_instanced_vertex_shader, fragment_shader=fragment_shader_edges),
+            'pick': dict(vertex_shader=mesh_instanced_vertex_shader, fragment_shader=fragment_shader_pick),
+        })
+
+        # Offscreen framebuffer (created on demand)
+        self.offscreen_framebuffer = None
+
+        # Framebuffer with object and element identifiers and VAOs by object name for picking (created on demand)
+        self.pick_framebuffer = None
+        self.pick_vaos = {}
+
+        # Compute shader that blends frames of sequences (created on demand)
+        self.sequence_interpolation_shader = None
+
+        # Active frame recorder
+        self.recorder = None
+
+        self.gpu_timer = GpuTimer(self.context)
+
+        if self.headless:
+            # Without window, only execute commands (e.g. `render_to_array`)
+            while not self.should_close:
+                self.command_queue.wait_for_commands(timeout=0.1)
+                self.__execute_commands()
+        else:
+            while not glfw.window_should_close(self.window):
+                t_start = time.perf_counter()
+                self.frame_upload_bytes = 0
+                self.frame_draw_calls = 0
+
+                self.__wait_for_events()
+                self.imgui_renderer.process_inputs()
+                glfw.make_context_current(self.window)
+                t_events = time.perf_counter()
+
+                queue_depth = self.command_queue.qsize()
+                num_commands = self.__execute_commands()
+                t_commands = time.perf_counter()
+
+                if not self.__should_redraw(num_commands):
+                    continue
+
+                with self.gpu_timer:
+                    self.__render_scene(self.camera)
+
+                    # Capture the frame (without GUI)
+                    if self.recorder is not None:
+                        self.recorder.capture(self.context.screen, self.viewport)
+                    t_scene = time.perf_counter()
+
+                    # Render the GUI
+                    imgui.new_frame()
+
+                    if self.show_stats_overlay:
+                        self.__render_stats_overlay()
+
+                    if self.user_gui_callback:
+                        # TODO: Implement error handling!
+                        try:
+                            self.user_gui_callback(self)
+                        except RuntimeError as e:
+                            print(f"Exception in GUI callback: {e}")
+
+                    imgui.render()
+                    self.imgui_renderer.render(imgui.get_draw_data())
+                    t_gui = time.perf_counter()
+
+                glfw.swap_buffers(self.window)
+
+                self.last_frame_time = time.perf_counter()
+
+                # Times in milliseconds
+                frame_statistics = {
+                    'events': 1000*(t_events - t_start),
+                    'commands': 1000*(t_commands - t_events),
+                    'scene': 1000*(t_scene - t_commands),
+                    'gui': 1000*(t_gui - t_scene),
+                    'swap': 1000*(self.last_frame_time - t_gui),
+                    'frame': 1000*(self.last_frame_time - t_start),
+                    'queue_depth': queue_depth,
+                    'upload_bytes': self.frame_upload_bytes,
+                    'draw_calls': self.frame_draw_calls,
+                    'culled': self.num_culled,
+                }
+                if self.gpu_timer.elapsed is not None:
+                    frame_statistics['gpu'] = self.gpu_timer.elapsed
+                self.statistics.record(frame_statistics)
+        
+            glfw.make_context_current(self.window)
 
-            glfw.swap_buffers(self.window)
-    
-        glfw.make_context_current(self.window)
+            if self.recorder is not None:
+                self.__stop_recording().join()
+
+            glfw.destroy_window(self.window)
+            #glfw.terminate()
+
+    def __execute_commands(self):
+        # Execute all queued commands (and updates of shared channels)
+        num_commands = self.__poll_shared_channels()
+        while not self.command_queue.empty():
+            num_commands += 1
+            command, futures = self.command_queue.get_nowait()
+
+            # Commands whose futures were all cancelled are skipped
+            futures = [f for f in futures if f.set_running_or_notify_cancel()]
+            if len(futures) == 0:
+                continue
+
+            try:
+                result = command()
+            except Exception as e:
+                print(e)
+                for f in futures:
+                    f.set_exception(e)
+            else:
+                for f in futures:
+                    f.set_result(result)
+        return num_commands
+
+    def __wait_for_events(self):
+        if self.render_policy == 'capped':
+            # Keep processing events until the next frame is due
+            next_frame_time = self.last_frame_time + 1/self.max_fps
+            remaining = next_frame_time - time.perf_counter()
+            while remaining > 0:
+                glfw.wait_events_timeout(remaining)
+                remaining = next_frame_time - time.perf_counter()
+            glfw.poll_events()
+        elif self.render_policy == 'on_demand' and not self.__is_redraw_pending():
+            # Sleep until an event arrives. Enqueued commands post an empty event to wake up the loop.
+            timeout = self.on_demand_timeout
+            if self.recorder is not None:
+                timeout = min(timeout, 1/self.recorder.fps)
+            if len(self.shared_channels) > 0:
+                # Producers of shared channels cannot wake up the loop
+                timeout = min(timeout, 1/self.max_fps)
+            glfw.wait_events_timeout(timeout)
+        else:
+            glfw.poll_events()
 
-        glfw.destroy_window(self.window)
-        #glfw.terminate()
+    def __is_redraw_pending(self):
+        return (self.redraw_requested or self.redraw_frames > 0 or not self.command_queue.empty()
+                or self.camera.version != self.camera_version
+                or any(not buffers['lod'].is_complete for buffers in self.buffers_all.values() if 'lod' in buffers)
+                or any(buffers['sequence'].is_playing for buffers in self.buffers_all.values() if 'sequence' in buffers))
 
-        self.is_open = False
+    def __should_redraw(self, num_commands):
+        redraw = (self.render_policy != 'on_demand' or num_commands > 0
+                  or self.__is_redraw_pending() or self.recorder is not None)
+
+        if redraw:
+            self.redraw_requested = False
+            self.redraw_frames = max(0, self.redraw_frames - 1)
+            self.camera_version = self.camera.version
+
+        return redraw
+
+    def __mark_input(self):
+        # Input can change the GUI, which needs a few frames to settle
+        self.redraw_frames = 3
+
+    def set_render_policy(self, policy, max_fps=None):
+        if policy not in MeshViewer.render_policies:
+            raise RuntimeError(f"Unknown render policy '{policy}', expected one of {MeshViewer.render_policies}.")
+
+        self.render_policy = policy
+        if max_fps is not None:
+            self.max_fps = max_fps
+
+        self.request_redraw()
+
+    def request_redraw(self):
+        # Redraw with policy 'on_demand', e.g. if the GUI callback shows changing state
+        self.redraw_requested = True
+        self.__wake_up()
+
+    def __wake_up(self):
+        if self.window is not None and self.render_policy != 'continuous':
+            glfw.post_empty_event()
+
+    def __render_scene(self, camera):
+        self.context.enable(moderngl.DEPTH_TEST | moderngl.CULL_FACE)
+        self.context.clear(*self.clear_color)
+
+        # Update shader data
+        self.transforms_buffer.write(create_transforms_block(camera.view_matrix, camera.projection_matrix, self.model_matrix))
+        self.transforms_buffer.bind_to_uniform_block(0)
+
+        # Sequences advance even if their object is not drawn (e.g. the base object of instances)
+        for buffers in self.buffers_all.values():
+            if 'sequence' in buffers:
+                self.frame_upload_bytes += buffers['sequence'].update(buffers['vbo'])
+
+        culled = self.__cull_objects(camera) if self.frustum_culling else set()
+        self.num_culled = len(culled)
+
+        for object_name, (mode, configure_func, vaos) in self.vaos_all.items():
+            if object_name in culled or not self.buffers_all[object_name].get('visible', True):
+                continue
+
+            buffers = self.buffers_all[object_name]
+            buffers.get('object_buffer', self.default_object_buffer).bind_to_uniform_block(1)
+            object_matrix = buffers.get('object_matrix', None)
+
+            # Level-of-detail objects select (and stream in) the nodes drawn for this camera
+            if 'lod' in buffers:
+                model_matrix = self.model_matrix if object_matrix is None else self.model_matrix @ object_matrix
+                self.frame_upload_bytes += buffers['lod'].update(camera, model_matrix)
+
+            configure_func(self.context)
+            for v in vaos:
+                self.__write_legacy_uniforms(v.program, camera, object_matrix)
+
+                # Edge materials draw lines with their own index buffer
+                v.render(mode=mode if v.extra is None or v.extra[3] is None else v.extra[3])
+                self.frame_draw_calls += 1
+
+        # Batched objects are drawn with one call per batch
+        if len(self.batches) > 0:
+            self.default_object_buffer.bind_to_uniform_block(1)
+            hidden = culled | {name for name, buffers in self.buffers_all.items() if not buffers.get('visible', True)}
+            for (_, _, point_size), batch in self.batches.items():
+                if point_size is not None:
+                    self.context.point_size = point_size
+                self.frame_draw_calls += batch.render(hidden)
+
+        # Render the coordinate system 
+        self.coordinate_system.render(self.context, self.transforms_buffer)
+        self.frame_draw_calls += 1
+
+    def __cull_objects(self, camera):
+        # Test the bounding boxes of all objects against the view frustum (vectorized over all objects)
+        for buffers in self.buffers_all.values():
+            if buffers['type'] == 'instances':
+                self.__update_instances_bounding_box(buffers)
+
+        names = [name for name, buffers in self.buffers_all.items() if buffers.get('aabb', None) is not None]
+
+        if len(names) == 0:
+            return set()
+
+        boxes = np.stack([self.buffers_all[name]['aabb'] for name in names])
+
+        # Objects with own transformation are tested with the combined transformation
+        if any('object_matrix' in self.buffers_all[name] for name in names):
+            identity = np.eye(4)
+            model_matrices = np.stack([self.model_matrix @ self.buffers_all[name].get('object_matrix', identity) for name in names])
+            boxes = transform_bounding_boxes(boxes, model_matrices)
+        else:
+            boxes = transform_bounding_boxes(boxes, self.model_matrix)
+        visible = intersect_frustum(camera.frustum_planes, boxes)
+
+        return {name for name, is_visible in zip(names, visible) if not is_visible}
+
+    def __render_stats_overlay(self):
+        summary = self.statistics.summary()
+
+        imgui.set_next_window_position(10, 10, condition=imgui.FIRST_USE_EVER)
+        imgui.begin("Statistics")
+        for name in ['frame', 'events', 'commands', 'scene', 'gui', 'swap', 'gpu']:
+            if name in summary:
+                imgui.text(f"{name:<9} {summary[name]['mean']:7.2f} ms (p95 {summary[name]['p95']:7.2f} ms)")
+        for name in ['queue_depth', 'upload_bytes', 'draw_calls', 'culled']:
+            if name in summary:
+                imgui.text(f"{name:<12} {summary[name]['last']:12.0f}")
+        imgui.end()
+
+    def stats(self):
+        # Rolling statistics of the recent frames (times in milliseconds) and counters of the command queue
+        summary = self.statistics.summary()
+        summary['command_queue'] = self.command_queue.statistics()
+        return summary
+
+    def __write_legacy_uniforms(self, program, camera, object_matrix=None):
+        # Custom programs may use plain uniforms instead of the `Transforms` and `ObjectTransform` blocks
+        if isinstance(program.get('model_view_matrix', None), moderngl.Uniform):
+            model_matrix = self.model_matrix if object_matrix is None else self.model_matrix @ object_matrix
+            program['model_view_matrix'].write(to_opengl_matrix(camera.view_matrix @ model_matrix))
+        if isinstance(program.get('projection_matrix', None), moderngl.Uniform):
+            program['projection_matrix'].write(to_opengl_matrix(camera.projection_matrix))
 
     def create_window(self):
         if not glfw.init():
@@ -142,7 +495,18 @@ class MeshViewer:
         glfw.set_key_callback(self.window, self.key_callback)
         glfw.set_char_callback(self.window, self.char_callback)
 
+    def create_offscreen_context(self):
+        # A standalone context does not require a display.
+        # EGL is tried first, which also works with software rasterizers like llvmpipe.
+        try:
+            self.context = moderngl.create_standalone_context(require=450, backend='egl')
+        except Exception:
+            self.context = moderngl.create_standalone_context(require=450)
+
+        self.context.enable_direct(0x8DB9) # GL_FRAMEBUFFER_SRGB
+
     def mouse_event_callback(self, window, xpos, ypos):
+        self.__mark_input()
         self.imgui_renderer.mouse_callback(window, xpos, ypos)
 
         # See: https://github.com/ocornut/imgui/blob/master/docs/FAQ.md#q-how-can-i-tell-whether-to-dispatch-mousekeyboard-to-dear-imgui-or-my-application
@@ -161,6 +525,8 @@ class MeshViewer:
             self.drag_point_right = (xpos, ypos)
 
     def mouse_button_callback(self, window, button, action, mods):
+        self.__mark_input()
+
         if imgui.get_io().want_capture_mouse:
             return
 
@@ -182,6 +548,7 @@ class MeshViewer:
                 self.drag_point_right = None
 
     def mouse_scroll_callback(self, window, x_offset: float, y_offset: float):
+        self.__mark_input()
         self.imgui_renderer.scroll_callback(window, x_offset, y_offset)
 
         if imgui.get_io().want_capture_mouse:
@@ -199,9 +566,11 @@ class MeshViewer:
             self.camera.viewport = self.viewport
 
     def window_resize_callback(self, window, width, height):
+        self.__mark_input()
         self.imgui_renderer.resize_callback(window, width, height)
 
     def key_callback(self, window, key, scancode, action, mods):
+        self.__mark_input()
         self.imgui_renderer.keyboard_callback(window, key, scancode, action, mods)
 
         if imgui.get_io().want_capture_keyboard:
@@ -211,33 +580,42 @@ class MeshViewer:
             self.user_key_callback(key, scancode, action, mods)
 
     def char_callback(self, window, char):
+        self.__mark_input()
         self.imgui_renderer.char_callback(window, char)
 
-    def __expand_colors(self, vertices, colors):
+    def __expand_colors(self, num_vertices, colors):
         if colors is None:
-            colors = 0.85*np.ones((vertices.shape[0], 3), dtype=np.float32)
+            colors = 0.85*np.ones((num_vertices, 3), dtype=np.float32)
             
-        colors = np.asarray(colors)
+        colors = to_numpy(colors)
 
         if len(colors.shape) == 1 and colors.shape[0] == 3:
-            colors = np.tile(colors[None, :], (len(vertices), 1))
+            colors = np.tile(colors[None, :], (num_vertices, 1))
 
         return colors
 
     def clear(self):
-        self.__enqueue_command(lambda: self.__clear())
+        return self.__enqueue_command(lambda: self.__clear())
 
     def __clear(self):
+        for object_name in list(self.buffers_all.keys()):
+            self.__release_object(object_name)
+
         self.buffers_all = {}
         self.vaos_all    = {}
+        self.pick_vaos   = {}
+
+        for batch in self.batches.values():
+            batch.release()
+        self.batches = {}
 
-    def set_mesh(self, v, f, n=None, c=None, object_name='default'):
-        self.__enqueue_command(lambda: self.__set_mesh(v, f, n, c, object_name))
+    def set_mesh(self, v, f, n=None, c=None, object_name='default', vertex_format=None, compute_normals=False):
+        return self.__enqueue_command(lambda: self.__set_mesh(v, f, n, c, object_name, vertex_format, compute_normals), object_name=object_name, operation='set_mesh', droppable=True)
 
-    def __set_mesh(self, v, f, n, c, object_name):
-        v_flat = v.ravel().astype('f4')
-        c_flat = self.__expand_colors(v, c).ravel().astype('f4')
-        f_flat = f.ravel().astype('i4')
+    def __set_mesh(self, v, f, n, c, object_name, vertex_format=None, compute_normals=False):
+        # Signed and unsigned 32-bit indices can be uploaded without conversion
+        f = to_numpy(f)
+        f_flat = as_contiguous_array(f, f.dtype if f.dtype in [np.int32, np.uint32] else 'i4').reshape(-1)
 
         if not object_name in self.buffers_all:
             self.buffers_all[object_name] = {'type': 'mesh'}
@@ -246,24 +624,45 @@ class MeshViewer:
         if buffers['type'] != 'mesh':
             raise RuntimeError(f"Entity '{object_name}' has type '{buffers['type']}' and is not a mesh.")
 
-        if n is not None:
-            n_flat = n.ravel().astype('f4')
-            buffers['vnbo'] = self.context.buffer(n_flat)
-        elif 'vnbo' in buffers:
-            del buffers['vnbo']
-
-        buffers['vbo'] = self.context.buffer(v_flat)
-        buffers['vcbo'] = self.context.buffer(c_flat)
-        buffers['ibo'] = self.context.buffer(f_flat)
+        self.__release_sequence(buffers)
+        buffers['vertex_format'] = check_vertex_format(vertex_format)
+
+        buffers['compute_normals'] = compute_normals
+        if compute_normals:
+            if n is not None:
+                raise RuntimeError(f"Normals of entity '{object_name}' cannot be passed if they are computed.")
+            n = self.__compute_vertex_normals(object_name, to_numpy(v), f)
+        else:
+            buffers.pop('vertex_normals', None)
+
+        self.__upload_vertex_attributes(buffers, v, n, c)
+        self.__upload_buffer(buffers, 'ibo', f_flat)
+        buffers['num_indices'] = len(f_flat)
+
+        # The edges (of the 'edges' material) are only extracted again if the faces changed
+        if 'eibo' in buffers and not np.array_equal(buffers['edge_faces'], f_flat):
+            self.__update_edges(buffers, f_flat)
         self.__update_vao(object_name)
 
-    def set_points(self, v, n=None, c=None, point_size=5, object_name='default'):
-        self.__enqueue_command(lambda: self.__set_points(v, n, c, point_size, object_name))
+    def __compute_vertex_normals(self, object_name, v, f=None):
+        # Area-weighted vertex normals. The face incidence is kept while the faces do not change (e.g. for deforming meshes).
+        buffers = self.buffers_all[object_name]
+
+        if v.dtype.names is not None:
+            raise RuntimeError(f"Normals of entity '{object_name}' cannot be computed for interleaved vertices.")
+
+        num_vertices = v.size // 3
+        vertex_normals = buffers.get('vertex_normals', None)
+        if vertex_normals is None or (f is not None and not vertex_normals.matches(f, num_vertices)):
+            vertex_normals = VertexNormals(f, num_vertices)
+            buffers['vertex_normals'] = vertex_normals
+
+        return vertex_normals(v)
+
+    def set_points(self, v, n=None, c=None, point_size=5, object_name='default', vertex_format=None):
+        return self.__enqueue_command(lambda: self.__set_points(v, n, c, point_size, object_name, vertex_format), object_name=object_name, operation='set_points', droppable=True)
     
-    def __set_points(self, v, n=None, c=None, point_size=5, object_name='default'):
-        v_flat = v.ravel().astype(np.float32)
-        c_flat = self.__expand_colors(v, c).ravel().astype(np.float32)
-        
+    def __set_points(self, v, n=None, c=None, point_size=5, object_name='default', vertex_format=None):
         if not object_name in self.buffers_all:
             self.buffers_all[object_name] = {'type': 'points'}
         buffers = self.buffers_all[object_name]
@@ -271,28 +670,489 @@ class MeshViewer:
         if buffers['type'] != 'points':
             raise RuntimeError(f"Entity '{object_name}' has type '{buffers['type']}' and is not a point cloud.")
 
+        self.__release_sequence(buffers)
         buffers['point_size'] = point_size
+        buffers['vertex_format'] = check_vertex_format(vertex_format)
 
-        if n is not None:
-            n_flat = n.ravel().astype('f4')
-            buffers['vnbo'] = self.context.buffer(n_flat)
-        elif 'vnbo' in buffers:
-            del buffers['vnbo']
+        v = to_numpy(v)
+        if self.__is_batchable(buffers, v, n):
+            v_flat = as_contiguous_array(v, 'f4').reshape(-1)
+            c_flat = as_contiguous_array(self.__expand_colors(len(v_flat) // 3, c), 'f4').reshape(-1)
+            self.__write_batched(object_name, ('points', 'flat', point_size), v_flat, c_flat)
+            return
+
+        self.__remove_from_batch(object_name)
+        self.__upload_vertex_attributes(buffers, v, n, c)
+        self.__update_vao(object_name)
+
+    def __is_batchable(self, buffers, v, n):
+        # Only small objects with positions and colors and the default material are batched
+        return (self.batching and n is None and v.dtype.names is None and v.size // 3 <= self.batch_max_vertices
+                and not buffers.get('unbatched', False) and buffers['vertex_format'] == check_vertex_format())
+
+    def __write_batched(self, object_name, batch_key, v_flat, c_flat):
+        buffers = self.buffers_all[object_name]
+
+        if buffers.get('batch', batch_key) != batch_key:
+            self.__remove_from_batch(object_name)
+
+        # Separate buffers of the object are replaced by a range in the batch
+        if object_name in self.vaos_all:
+            self.__release_object(object_name)
+            self.vaos_all.pop(object_name)
+
+        if not batch_key in self.batches:
+            object_type, program_name, _ = batch_key
+            mode = moderngl.POINTS if object_type == 'points' else moderngl.LINES
+            self.batches[batch_key] = Batch(self.context, self.programs_default[program_name], mode, self.buffer_growth_factor)
 
-        buffers['vbo'] = self.context.buffer(v_flat)
-        buffers['vcbo'] = self.context.buffer(c_flat)
+        self.frame_upload_bytes += self.batches[batch_key].write(object_name, v_flat, c_flat)
+        buffers['batch'] = batch_key
+        buffers['num_vertices'] = len(v_flat) // 3
+        buffers['aabb'] = compute_bounding_box(v_flat.reshape(-1, 3))
+
+    def __remove_from_batch(self, object_name):
+        buffers = self.buffers_all.get(object_name, {})
+        if not 'batch' in buffers:
+            return
+
+        batch_key = buffers.pop('batch')
+        self.batches[batch_key].remove(object_name)
+        if len(self.batches[batch_key]) == 0:
+            self.batches.pop(batch_key).release()
+
+    def __unbatch_object(self, object_name):
+        # Move a batched object into separate buffers (e.g. for custom materials or partial updates), where it stays
+        buffers = self.buffers_all[object_name]
+        buffers['unbatched'] = True
+
+        if not 'batch' in buffers:
+            return
+
+        # Empty objects get the same minimal buffers as in `__upload_buffer`
+        for name in ['vbo', 'vcbo']:
+            buffers[name] = self.context.buffer(reserve=max(12*buffers['num_vertices'], 4))
+        self.batches[buffers['batch']].copy_to(object_name, buffers['vbo'], buffers['vcbo'])
+
+        self.__remove_from_batch(object_name)
         self.__update_vao(object_name)
 
-    def set_lines(self, start: np.ndarray, end: np.ndarray, c=None, object_name='default'):
-        self.__enqueue_command(lambda: self.__set_lines(start, end, c, object_name))
+    def set_lod_points(self, v, c=None, point_size=2, point_budget=1000000, max_points_per_node=20000, object_name='default'):
+        # Point cloud with level of detail: only the octree nodes with the largest projected size are drawn,
+        # with at most `point_budget` points per frame. The octree is built on the calling thread.
+        v = to_numpy(v)
+        octree = PointOctree(v, self.__expand_colors(len(v), c), max_points_per_node=max_points_per_node)
+        return self.__enqueue_command(lambda: self.__set_lod_points(octree, point_size, point_budget, object_name), object_name=object_name, operation='set_lod_points')
+
+    def __set_lod_points(self, octree, point_size, point_budget, object_name):
+        if object_name in self.buffers_all and self.buffers_all[object_name]['type'] != 'lod_points':
+            raise RuntimeError(f"Entity '{object_name}' has type '{self.buffers_all[object_name]['type']}' and is not a level-of-detail point cloud.")
+
+        # Keep the material of a replaced point cloud
+        program = self.programs_default['flat']
+        if object_name in self.buffers_all:
+            program = self.buffers_all[object_name]['lod'].program
+            self.__release_object(object_name)
+
+        lod = LodPointCloud(self.context, octree, program, point_budget)
+
+        self.buffers_all[object_name] = {
+            'type': 'lod_points',
+            'lod': lod,
+            'point_size': point_size,
+            'aabb': octree.aabb.astype(np.float32)
+        }
+
+        def configure_context(context):
+            context.point_size = point_size
+
+        # The drawn VAOs are replaced by the level-of-detail object every frame
+        self.vaos_all[object_name] = (
+            moderngl.POINTS,
+            configure_context,
+            lod.vaos
+        )
+
+    def set_sequence(self, object_name, frames, fps=30, f=None, c=None, point_size=5, loop=True, interpolate=False, play=True, max_resident_bytes=2**30):
+        # Animation of the vertex positions frames (T,N,3) of a mesh (with faces f) or a point cloud.
+        # The frames are uploaded once and played back on the GPU (see `play_sequence`, `pause_sequence` and `seek_sequence`),
+        # with `interpolate`, the positions between frames are blended.
+        frames = to_numpy(frames)
+        if frames.ndim != 3 or frames.shape[2] != 3:
+            raise RuntimeError(f"Frames of sequence '{object_name}' must have the shape (T,N,3), got {frames.shape}.")
+
+        return self.__enqueue_command(lambda: self.__set_sequence(object_name, frames, fps, f, c, point_size, loop, interpolate, play, max_resident_bytes), object_name=object_name, operation='set_sequence')
+
+    def __set_sequence(self, object_name, frames, fps, f, c, point_size, loop, interpolate, play, max_resident_bytes):
+        if not object_name in self.buffers_all:
+            self.buffers_all[object_name] = {'type': 'points' if f is None else 'mesh'}
+        buffers = self.buffers_all[object_name]
+
+        # The sequence writes into the vertex buffer of the object, which must not be shared
+        buffers['unbatched'] = True
+
+        if f is None:
+            self.__set_points(frames[0], None, c, point_size, object_name)
+        else:
+            self.__set_mesh(frames[0], f, None, c, object_name)
+
+        if interpolate and self.sequence_interpolation_shader is None:
+            self.sequence_interpolation_shader = self.context.compute_shader(sequence_interpolation_compute_shader)
+
+        sequence = Sequence(self.context, frames, fps, loop, self.sequence_interpolation_shader if interpolate else None, max_resident_bytes)
+        self.frame_upload_bytes += sequence.buffer.size
+        buffers['sequence'] = sequence
+
+        # Bounds of all frames (sequences that are streamed in chunks are not culled)
+        buffers['aabb'] = compute_bounding_box(frames.reshape(-1, 3)) if sequence.frames is None else None
+
+        if play:
+            sequence.play()
+
+    def play_sequence(self, object_name='default'):
+        return self.__enqueue_command(lambda: self.__get_sequence(object_name).play(), object_name=object_name)
+
+    def pause_sequence(self, object_name='default'):
+        return self.__enqueue_command(lambda: self.__get_sequence(object_name).pause(), object_name=object_name)
+
+    def seek_sequence(self, t, object_name='default'):
+        # Jump to time `t` (in seconds)
+        return self.__enqueue_command(lambda: self.__get_sequence(object_name).seek(t), object_name=object_name)
+
+    def __get_sequence(self, object_name):
+        if not 'sequence' in self.buffers_all.get(object_name, {}):
+            raise RuntimeError(f"Entity '{object_name}' does not exist or has no sequence.")
+        return self.buffers_all[object_name]['sequence']
+
+    def __release_sequence(self, buffers):
+        if 'sequence' in buffers:
+            buffers.pop('sequence').release()
+
+    def set_instances(self, object_name, base_object, transforms, colors=None):
+        # Draws copies of the object `base_object` with one instanced draw call.
+        # transforms.shape = (K,4,4), colors.shape = (K,3) or (3,) (default: colors of the base object)
+        # Not coalesced: the command depends on the base object, so it must stay behind earlier updates of it
+        # (frequent updates of the transformations should use `set_instance_transforms`).
+        return self.__enqueue_command(lambda: self.__set_instances(object_name, base_object, transforms, colors), object_name=object_name)
+
+    def __set_instances(self, object_name, base_object, transforms, colors):
+        if not base_object in self.buffers_all:
+            raise RuntimeError(f"Entity '{base_object}' does not exist.")
+
+        if self.buffers_all[base_object]['type'] not in ['mesh', 'points', 'lines']:
+            raise RuntimeError(f"Entity '{base_object}' has type '{self.buffers_all[base_object]['type']}' and cannot be instanced.")
+
+        # Instances use the buffers of the base object
+        self.__unbatch_object(base_object)
+
+        if not object_name in self.buffers_all:
+            self.buffers_all[object_name] = {'type': 'instances'}
+        buffers = self.buffers_all[object_name]
+
+        if buffers['type'] != 'instances':
+            raise RuntimeError(f"Entity '{object_name}' has type '{buffers['type']}' and is not an instanced object.")
+
+        transforms = np.asarray(to_numpy(transforms), dtype=np.float32).reshape(-1, 4, 4)
+
+        # The alpha channel selects between the instance color (1) and the vertex colors of the base object (0)
+        instance_colors = np.zeros((len(transforms), 4), dtype=np.float32)
+        if colors is not None:
+            instance_colors[:, :3] = self.__expand_colors(len(transforms), colors)
+            instance_colors[:, 3] = 1
+
+        # The VAOs are updated with the buffers of the (new) base object
+        buffers['base'] = base_object
+
+        buffers['transforms'] = transforms
+        buffers['num_instances'] = len(transforms)
+        self.__upload_buffer(buffers, 'instance_data', create_instance_data(transforms))
+        self.__upload_buffer(buffers, 'instance_colors', instance_colors)
+        self.__update_vao(object_name)
+
+    def set_instance_transforms(self, object_name, transforms):
+        # Only updates the transformations (the number of instances must not change)
+        return self.__enqueue_command(lambda: self.__set_instance_transforms(object_name, transforms), object_name=object_name, operation='set_instance_transforms')
+
+    def __set_instance_transforms(self, object_name, transforms):
+        if not object_name in self.buffers_all or self.buffers_all[object_name]['type'] != 'instances':
+            raise RuntimeError(f"Entity '{object_name}' is not an instanced object.")
+        buffers = self.buffers_all[object_name]
+
+        transforms = np.asarray(to_numpy(transforms), dtype=np.float32).reshape(-1, 4, 4)
+
+        if len(transforms) != buffers['num_instances']:
+            raise RuntimeError(f"Entity '{object_name}' has {buffers['num_instances']} instances, got {len(transforms)} transformations.")
+
+        buffers['transforms'] = transforms
+        self.__upload_buffer(buffers, 'instance_data', create_instance_data(transforms))
+
+    def __update_instances_bounding_box(self, buffers):
+        # The bounding box of all instances, only recomputed if the base object or the transformations changed
+        base_aabb = self.buffers_all[buffers['base']].get('aabb', None)
+        key = buffers.get('aabb_key', None)
+        if key is not None and key[0] is base_aabb and key[1] is buffers['transforms']:
+            return
+
+        if base_aabb is None or len(buffers['transforms']) == 0:
+            buffers['aabb'] = None
+        else:
+            boxes = transform_bounding_boxes(np.broadcast_to(base_aabb, (len(buffers['transforms']), 2, 3)), buffers['transforms'])
+            buffers['aabb'] = np.stack([boxes[:, 0].min(axis=0), boxes[:, 1].max(axis=0)])
+        buffers['aabb_key'] = (base_aabb, buffers['transforms'])
+
+    def set_object_transform(self, object_name, transform):
+        # Rigid (or affine) transformation of a single object, applied on the GPU before the global model matrix.
+        # Moving an object only uploads its 4x4 matrix instead of the vertices.
+        return self.__enqueue_command(lambda: self.__set_object_transform(object_name, transform), object_name=object_name, operation='set_object_transform')
+
+    def __set_object_transform(self, object_name, transform):
+        if not object_name in self.buffers_all:
+            raise RuntimeError(f"Entity '{object_name}' does not exist.")
+        buffers = self.buffers_all[object_name]
+
+        transform = np.asarray(to_numpy(transform), dtype=np.float64).reshape(4, 4)
+
+        # Batched objects share a transformation
+        self.__unbatch_object(object_name)
+
+        buffers['object_matrix'] = transform
+        self.__update_object_block(object_name)
+
+    def __update_object_block(self, object_name):
+        # Objects only have an own `ObjectTransform` block if they have a transformation or octahedral normals
+        buffers = self.buffers_all[object_name]
+        primitive_buffers = self.buffers_all[buffers['base']] if buffers['type'] == 'instances' else buffers
+
+        object_matrix = buffers.get('object_matrix', None)
+        normal_encoding = 1 if primitive_buffers.get('vertex_format', {}).get('normal', None) == 'oct' else 0
+
+        if object_matrix is None and normal_encoding == 0:
+            self.__release_buffer(buffers, 'object_buffer')
+        else:
+            self.__upload_buffer(buffers, 'object_buffer', create_object_block(np.eye(4) if object_matrix is None else object_matrix, normal_encoding))
+
+    def create_shared_channel(self, object_name, max_vertices, object_type='points', max_faces=0, normals=False, colors=True, point_size=5, num_slots=3):
+        # Channel for producers in other processes (e.g. a multiprocessing pool). The returned handle is picklable,
+        # a producer opens it with `handle.open()` and publishes geometry with `write(v, f=None, n=None, c=None)`.
+        # The render thread uploads the newest complete slot directly from shared memory.
+        channel = SharedGeometryChannel(object_name, object_type, max_vertices, max_faces, normals, colors, num_slots)
+        channel.point_size = point_size
+        self.__enqueue_command(lambda: self.__add_shared_channel(channel))
+        return channel.handle
+
+    def __add_shared_channel(self, channel):
+        name = channel.handle.object_name
+        if name in self.shared_channels:
+            self.shared_channels.pop(name).close()
+        self.shared_channels[name] = channel
+
+    def close_shared_channel(self, object_name):
+        # Stop polling and release the shared memory (the object is kept)
+        return self.__enqueue_command(lambda: self.__close_shared_channel(object_name))
+
+    def __close_shared_channel(self, object_name):
+        if not object_name in self.shared_channels:
+            raise RuntimeError(f"Entity '{object_name}' has no shared channel.")
+        self.shared_channels.pop(object_name).close()
+
+    def __poll_shared_channels(self):
+        # Upload the newest geometry of the shared channels. Returns the number of uploads.
+        num_uploads = 0
+
+        for name, channel in self.shared_channels.items():
+            # Retry if the producer overwrote the slot during the upload (only if it laps the reader)
+            for _ in range(3):
+                acquired = channel.acquire()
+                if acquired is None:
+                    break
+
+                slot, sequence, frame = acquired
+                views = channel.views(slot)
+
+                try:
+                    if channel.handle.object_type == 'mesh':
+                        self.__set_mesh(views['v'], views['f'], views['n'], views['c'], name)
+                    else:
+                        self.__set_points(views['v'], views['n'], views['c'], channel.point_size, name)
+                except RuntimeError as e:
+                    print(e)
+
+                if channel.release(slot, sequence, frame):
+                    num_uploads += 1
+                    break
+
+        return num_uploads
+
+    def start_streaming_server(self, address=('127.0.0.1', 0), max_message_size=2**30):
+        # Accept updates of `StreamingClient`s over TCP (host, port) or a Unix domain socket (path).
+        # Returns the server, its `address` is the bound address (e.g. with the port chosen for port 0).
+        # Connections that send messages with more than `max_message_size` bytes of array data are closed.
+        if self.streaming_server is not None:
+            raise RuntimeError(f"A streaming server is already running on {self.streaming_server.address}.")
+
+        self.streaming_server = StreamingServer(self, address, max_message_size)
+        return self.streaming_server
+
+    def stop_streaming_server(self):
+        if self.streaming_server is not None:
+            self.streaming_server.close()
+            self.streaming_server = None
+
+    def set_visible(self, visible, object_name='default'):
+        # Hidden objects are kept but not drawn (e.g. the base object of instances)
+        return self.__enqueue_command(lambda: self.__set_visible(visible, object_name), object_name=object_name, operation='set_visible')
+
+    def __set_visible(self, visible, object_name):
+        if not object_name in self.buffers_all:
+            raise RuntimeError(f"Entity '{object_name}' does not exist.")
+        self.buffers_all[object_name]['visible'] = visible
+
+    def __upload_vertex_attributes(self, buffers, v, n, c):
+        v = to_numpy(v)
+
+        if v.dtype.names is not None:
+            # Interleaved vertices with the fields 'position' and (optionally) 'normal' and 'color'
+            if not 'position' in v.dtype.names:
+                raise RuntimeError(f"Interleaved vertices must have a 'position' field, found {v.dtype.names}.")
+
+            if (n is not None and 'normal' in v.dtype.names) or (c is not None and 'color' in v.dtype.names):
+                raise RuntimeError("Normals and colors cannot be passed separately if they are part of the interleaved vertices.")
+
+            buffers['interleaved'] = v.dtype
+            v_flat = as_contiguous_array(v).reshape(-1)
+            num_vertices = len(v_flat)
+        else:
+            buffers.pop('interleaved', None)
+            v_flat = encode_vertex_attribute(v, 'position', buffers['vertex_format']['position'])
+            num_vertices = v.size // 3
+
+        fields = v.dtype.names or []
+        vertex_format = buffers['vertex_format']
+
+        if n is not None:
+            self.__upload_buffer(buffers, 'vnbo', encode_vertex_attribute(n, 'normal', vertex_format['normal']))
+        else:
+            self.__release_buffer(buffers, 'vnbo')
+
+        if 'color' in fields:
+            self.__release_buffer(buffers, 'vcbo')
+        else:
+            self.__upload_buffer(buffers, 'vcbo', encode_vertex_attribute(self.__expand_colors(num_vertices, c), 'color', vertex_format['color']))
+
+        self.__upload_buffer(buffers, 'vbo', v_flat)
+        buffers['num_vertices'] = num_vertices
+        buffers['aabb'] = compute_bounding_box(self.__get_positions(buffers, v_flat))
+
+    def __get_positions(self, buffers, v_flat):
+        # Positions (N,3) of flat vertex data
+        if 'interleaved' in buffers:
+            return v_flat['position']
+        if buffers['vertex_format']['position'] == 'f2':
+            return v_flat.reshape(-1, 4)[:, :3]
+        return v_flat.reshape(-1, 3)
+
+    def update_mesh_attributes(self, object_name='default', v=None, n=None, c=None, offset=0):
+        # Update vertex attributes of an existing mesh without touching its faces.
+        # Only the passed attributes are uploaded, starting at vertex `offset`.
+        operation = ('update_attributes', offset) + self.__get_attribute_key(v, n, c)
+        return self.__enqueue_command(lambda: self.__update_attributes(object_name, 'mesh', v, n, c, offset), object_name=object_name, operation=operation, droppable=True)
+
+    def update_points_attributes(self, object_name='default', v=None, n=None, c=None, offset=0):
+        operation = ('update_attributes', offset) + self.__get_attribute_key(v, n, c)
+        return self.__enqueue_command(lambda: self.__update_attributes(object_name, 'points', v, n, c, offset), object_name=object_name, operation=operation, droppable=True)
+
+    def __get_attribute_key(self, v, n, c):
+        # Updates of the same attributes and vertex range supersede each other
+        return tuple(None if a is None else np.shape(a) for a in [v, n, c])
+
+    def __update_attributes(self, object_name, object_type, v, n, c, offset):
+        if not object_name in self.buffers_all:
+            raise RuntimeError(f"Entity '{object_name}' does not exist.")
+        buffers = self.buffers_all[object_name]
+
+        if buffers['type'] != object_type:
+            raise RuntimeError(f"Entity '{object_name}' has type '{buffers['type']}' and is not of type '{object_type}'.")
+
+        self.__unbatch_object(object_name)
+
+        v, n, c = [to_numpy(a) if a is not None else None for a in [v, n, c]]
+        interleaved_fields = buffers['interleaved'].names if 'interleaved' in buffers else []
+
+        counts = [len(a) for a in [n, c] if a is not None and np.ndim(a) > 1]
+        if v is not None:
+            # Positions can be flat (3N,) as in `set_points`/`set_mesh`
+            counts.insert(0, len(v) if v.dtype.names is not None else v.size // 3)
+        if len(counts) == 0:
+            if c is None:
+                return
+            # A single color is applied to all vertices from `offset` on
+            counts = [buffers['num_vertices'] - offset]
+        count = counts[0]
+
+        if any(cnt != count for cnt in counts):
+            raise RuntimeError(f"Attributes of entity '{object_name}' have different lengths {counts}.")
+
+        if offset < 0 or offset + count > buffers['num_vertices']:
+            raise RuntimeError(f"Vertex range [{offset}, {offset + count}) is out of bounds for entity '{object_name}' with {buffers['num_vertices']} vertices.")
+
+        # Nothing to write (e.g. a single color for an object without vertices)
+        if count == 0:
+            return
+
+        layout_changed = False
+
+        # Computed normals follow full updates of the positions (partial updates keep the normals)
+        if buffers.get('compute_normals', False) and n is not None:
+            raise RuntimeError(f"Normals of entity '{object_name}' are computed and cannot be updated.")
+
+        if buffers.get('compute_normals', False) and v is not None and count == buffers['num_vertices']:
+            n = self.__compute_vertex_normals(object_name, v)
+
+        if (n is not None and 'normal' in interleaved_fields) or (c is not None and 'color' in interleaved_fields):
+            raise RuntimeError(f"Normals and colors of entity '{object_name}' are part of the interleaved vertices and must be updated with them.")
+
+        if v is not None:
+            if 'interleaved' in buffers:
+                if v.dtype != buffers['interleaved']:
+                    raise RuntimeError(f"Interleaved vertices of entity '{object_name}' have type {buffers['interleaved']}, got {v.dtype}.")
+                v_flat = as_contiguous_array(v).reshape(-1)
+            else:
+                v_flat = encode_vertex_attribute(v, 'position', buffers['vertex_format']['position'])
+            self.__write_buffer_range(buffers, 'vbo', v_flat, offset, count)
+
+            # The bounding box of a partial update can only grow
+            aabb = compute_bounding_box(self.__get_positions(buffers, v_flat))
+            buffers['aabb'] = aabb if count == buffers['num_vertices'] else merge_bounding_boxes(buffers['aabb'], aabb)
+
+        if n is not None:
+            n_flat = encode_vertex_attribute(n, 'normal', buffers['vertex_format']['normal'])
+            if 'vnbo' in buffers:
+                self.__write_buffer_range(buffers, 'vnbo', n_flat, offset, count)
+            elif count == buffers['num_vertices']:
+                # Adding normals changes the attribute layout
+                self.__upload_buffer(buffers, 'vnbo', n_flat)
+                layout_changed = True
+            else:
+                raise RuntimeError(f"Entity '{object_name}' has no normals, a partial update is not possible.")
+
+        if c is not None:
+            self.__write_buffer_range(buffers, 'vcbo', encode_vertex_attribute(self.__expand_colors(count, c), 'color', buffers['vertex_format']['color']), offset, count)
+
+        if layout_changed:
+            self.__update_vao(object_name)
+
+    def set_lines(self, start: np.ndarray, end: np.ndarray, c=None, object_name='default', vertex_format=None):
+        return self.__enqueue_command(lambda: self.__set_lines(start, end, c, object_name, vertex_format), object_name=object_name, operation='set_lines', droppable=True)
     
-    def __set_lines(self, start: np.ndarray, end: np.ndarray, c=None, object_name='default'):
+    def __set_lines(self, start: np.ndarray, end: np.ndarray, c=None, object_name='default', vertex_format=None):
+        start = to_numpy(start)
+        end   = to_numpy(end)
+
         # Interleave the start and end tensors
-        v = np.empty((start.shape[0]+end.shape[0], start.shape[1]), dtype=start.dtype)
+        v = np.empty((start.shape[0]+end.shape[0], start.shape[1]), dtype=np.float32)
         v[0::2, :] = start
         v[1::2, :] = end
-        v_flat     = v.ravel().astype(np.float32)
-        c_flat     = self.__expand_colors(start, c).repeat(2, axis=0).ravel().astype(np.float32)
+        c          = to_numpy(self.__expand_colors(len(start), c)).repeat(2, axis=0)
         
         if not object_name in self.buffers_all:
             self.buffers_all[object_name] = {'type': 'lines'}
@@ -301,70 +1161,368 @@ class MeshViewer:
         if buffers['type'] != 'lines':
             raise RuntimeError(f"Entity '{object_name}' has type '{buffers['type']}' and is not a line set.")
 
-        buffers['vbo']  = self.context.buffer(v_flat)
-        buffers['vcbo'] = self.context.buffer(c_flat)
+        buffers['vertex_format'] = check_vertex_format(vertex_format)
+
+        v_flat = encode_vertex_attribute(v, 'position', buffers['vertex_format']['position'])
+        c_flat = encode_vertex_attribute(c, 'color', buffers['vertex_format']['color'])
+
+        if self.__is_batchable(buffers, v, None):
+            self.__write_batched(object_name, ('lines', 'flat', None), v_flat, c_flat)
+            return
+
+        self.__remove_from_batch(object_name)
+
+        self.__upload_buffer(buffers, 'vbo', v_flat)
+        self.__upload_buffer(buffers, 'vcbo', c_flat)
+        buffers['num_vertices'] = len(v)
+        buffers['aabb'] = compute_bounding_box(v)
         self.__update_vao(object_name)
 
     def remove_object(self, object_name):
-        self.__enqueue_command(lambda: self.__remove_object(object_name))
+        return self.__enqueue_command(lambda: self.__remove_object(object_name), object_name=object_name)
         
     def __remove_object(self, object_name):
         assert object_name in self.buffers_all
-        assert object_name in self.vaos_all
 
+        self.__release_object(object_name)
         self.buffers_all.pop(object_name, None)
         self.vaos_all.pop(object_name, None)
 
+        # Instances of the object are removed with it
+        for name in [name for name, buffers in self.buffers_all.items() if buffers.get('base', None) == object_name]:
+            self.__remove_object(name)
+
+    def __release_object(self, object_name):
+        if object_name in self.vaos_all:
+            for v in self.vaos_all[object_name][2]:
+                v.release()
+
+        if object_name in self.pick_vaos:
+            self.pick_vaos.pop(object_name).release()
+
+        self.__remove_from_batch(object_name)
+
+        buffers = self.buffers_all.get(object_name, {})
+        if 'lod' in buffers:
+            buffers['lod'].release()
+        self.__release_sequence(buffers)
+        for name in [name for name, buffer in buffers.items() if isinstance(buffer, moderngl.Buffer)]:
+            self.__release_buffer(buffers, name)
+
     def set_model_matrix(self, model_matrix):
-        self.__enqueue_command(lambda: self.__set_model_matrix(model_matrix))
+        return self.__enqueue_command(lambda: self.__set_model_matrix(model_matrix), operation='set_model_matrix')
 
     def __set_model_matrix(self, model_matrix):
         self.model_matrix = model_matrix
         self.inverse_model_matrix = np.linalg.inv(self.model_matrix)
 
     def set_material(self, material, index=0, object_name='default'):
-        self.__enqueue_command(lambda: self.__set_material(material, index, object_name))
+        return self.__enqueue_command(lambda: self.__set_material(material, index, object_name), object_name=object_name)
 
     def __set_material(self, material, index, object_name):
-        if isinstance(material, str):
-            material = self.programs_default[material]
-        
         buffers = self.buffers_all[object_name]
 
-        if buffers['type'] == 'mesh':
-            vao = self.__create_mesh_vao(buffers, material)
-        elif buffers['type'] == 'points':
-            vao = self.__create_point_vao(buffers, material)
+        # Edges are drawn as lines of the unique mesh edges (instead of a geometry shader like 'wireframe')
+        edges = isinstance(material, str) and material == 'edges'
+        if edges and (self.buffers_all[buffers['base']] if buffers['type'] == 'instances' else buffers)['type'] != 'mesh':
+            raise RuntimeError(f"The material 'edges' requires a mesh, entity '{object_name}' has type '{buffers['type']}'.")
+
+        if isinstance(material, str):
+            material = self.programs_instanced[material] if buffers['type'] == 'instances' else self.programs_default[material]
+
+        if 'lod' in buffers:
+            # All nodes of level-of-detail objects are drawn with a single material
+            if index != 0:
+                raise RuntimeError(f"Level-of-detail object '{object_name}' only supports a single material.")
+            buffers['lod'].set_program(material)
+            return
+
+        self.__unbatch_object(object_name)
+
+        vao = self.__create_vao(buffers, material, edges=edges)
 
         if index >= len(self.vaos_all[object_name][2]):
             self.vaos_all[object_name][2].append(vao)
         else:
+            self.vaos_all[object_name][2][index].release()
             self.vaos_all[object_name][2][index] = vao
 
     def remove_material(self, index=0, object_name='default'):
-        self.__enqueue_command(lambda: self.__remove_material(index, object_name))
+        return self.__enqueue_command(lambda: self.__remove_material(index, object_name), object_name=object_name)
 
     def __remove_material(self, index, object_name):
+        if 'lod' in self.buffers_all[object_name]:
+            raise RuntimeError(f"Level-of-detail object '{object_name}' only supports a single material.")
+
+        self.__unbatch_object(object_name)
+
         vaos = self.vaos_all[object_name][2]
 
         if len(vaos) == 0:
             return
 
         if index >= len(vaos):
-            vaos.pop()
+            vaos.pop().release()
         else:
-            vaos.pop(index)
+            vaos.pop(index).release()
+
+    def render_to_array(self, camera=None, depth=False, alpha=False):
+        # Render the scene offscreen and return the image (HxWx3 or HxWx4, uint8)
+        # and optionally the depth buffer (HxW, float32 in [0, 1]).
+        # The image size is given by the viewport of the camera.
+        return self.__enqueue_command(lambda: self.__render_to_array(camera, depth, alpha), wait=True)
+
+    def __render_to_array(self, camera, depth, alpha):
+        if camera is None:
+            camera = self.camera
+
+        # Include the newest data of shared channels
+        self.__poll_shared_channels()
+
+        size = (camera.viewport[2] - camera.viewport[0], camera.viewport[3] - camera.viewport[1])
+
+        if self.offscreen_framebuffer is None or self.offscreen_framebuffer.size != size:
+            if self.offscreen_framebuffer is not None:
+                for attachment in self.offscreen_framebuffer.color_attachments + (self.offscreen_framebuffer.depth_attachment,):
+                    attachment.release()
+                self.offscreen_framebuffer.release()
+
+            # Store sRGB colors, like the default framebuffer of the window
+            try:
+                color = self.context.texture(size, 4, internal_format=0x8C43) # GL_SRGB8_ALPHA8
+            except TypeError:
+                color = self.context.texture(size, 4)
+
+            self.offscreen_framebuffer = self.context.framebuffer(
+                color_attachments=[color],
+                depth_attachment=self.context.depth_texture(size)
+            )
+
+        t_start = time.perf_counter()
+        draw_calls = self.frame_draw_calls
 
-    def __enqueue_command(self, command, wait=False):
+        self.offscreen_framebuffer.use()
+        with self.gpu_timer:
+            self.__render_scene(camera)
+        t_scene = time.perf_counter()
+
+        components = 4 if alpha else 3
+        image = np.frombuffer(self.offscreen_framebuffer.read(components=components, dtype='f1'), dtype=np.uint8)
+        image = image.reshape(size[1], size[0], components)[::-1].copy()
+
+        if depth:
+            depth_image = np.frombuffer(self.offscreen_framebuffer.read(attachment=-1, components=1, dtype='f4'), dtype=np.float32)
+            depth_image = depth_image.reshape(size[1], size[0])[::-1].copy()
+
+        if not self.headless:
+            self.context.screen.use()
+            self.context.viewport = self.viewport
+        else:
+            # Without render loop, each offscreen frame is recorded (uploads since the previous frame)
+            frame_statistics = {
+                'scene': 1000*(t_scene - t_start),
+                'readback': 1000*(time.perf_counter() - t_scene),
+                'queue_depth': self.command_queue.qsize(),
+                'upload_bytes': self.frame_upload_bytes,
+                'draw_calls': self.frame_draw_calls - draw_calls,
+                'culled': self.num_culled,
+            }
+            if self.gpu_timer.elapsed is not None:
+                frame_statistics['gpu'] = self.gpu_timer.elapsed
+            self.statistics.record(frame_statistics)
+            self.frame_upload_bytes = 0
+
+        return (image, depth_image) if depth else image
+
+    def pick(self, x, y, camera=None, radius=2):
+        # Object and element (face, point or line) at pixel (x, y) of the viewport, with the origin at the top left
+        # (like the rows of `render_to_array`). Returns (object name, element index, depth) or None.
+        # The nearest hit within `radius` pixels is returned. Instances return the element of the base object.
+        return self.__enqueue_command(lambda: self.__pick(x, y, camera, radius), wait=True)
+
+    def __pick(self, x, y, camera, radius):
+        if camera is None:
+            camera = self.camera
+
+        size = (camera.viewport[2] - camera.viewport[0], camera.viewport[3] - camera.viewport[1])
+
+        if self.pick_framebuffer is None or self.pick_framebuffer.size != size:
+            if self.pick_framebuffer is not None:
+                for attachment in self.pick_framebuffer.color_attachments + (self.pick_framebuffer.depth_attachment,):
+                    attachment.release()
+                self.pick_framebuffer.release()
+
+            self.pick_framebuffer = self.context.framebuffer(
+                color_attachments=[self.context.texture(size, 2, dtype='u4')],
+                depth_attachment=self.context.depth_texture(size)
+            )
+
+        # Only the pixels around the cursor are rasterized
+        x, y = int(x), size[1] - 1 - int(y)
+        x_min, y_min = max(x - radius, 0), max(y - radius, 0)
+        x_max, y_max = min(x + radius + 1, size[0]), min(y + radius + 1, size[1])
+        if x_min >= x_max or y_min >= y_max:
+            return None
+        region = (x_min, y_min, x_max - x_min, y_max - y_min)
+
+        self.pick_framebuffer.use()
+        self.context.scissor = region
+        self.pick_framebuffer.clear(depth=1.0, viewport=region)
+
+        names = self.__render_pick(camera)
+
+        self.context.scissor = None
+
+        ids = np.frombuffer(self.pick_framebuffer.read(viewport=region, components=2, dtype='u4'), dtype=np.uint32).reshape(region[3], region[2], 2)
+        depth = np.frombuffer(self.pick_framebuffer.read(viewport=region, attachment=-1, components=1, dtype='f4'), dtype=np.float32).reshape(region[3], region[2])
+
+        if not self.headless:
+            self.context.screen.use()
+            self.context.viewport = self.viewport
+
+        rows, columns = np.nonzero(ids[..., 0])
+        if len(rows) == 0:
+            return None
+
+        # Nearest pixel to the cursor, then nearest to the camera
+        distance = (columns + x_min - x)**2 + (rows + y_min - y)**2
+        i = np.lexsort((depth[rows, columns], distance))[0]
+        object_id, element_index = ids[rows[i], columns[i]]
+
+        return names[object_id - 1], int(element_index), float(depth[rows[i], columns[i]])
+
+    def __render_pick(self, camera):
+        # Draw the identifiers of the visible objects. Returns the object names by identifier (starting at 1).
+        self.context.enable(moderngl.DEPTH_TEST | moderngl.CULL_FACE)
+
+        self.transforms_buffer.write(create_transforms_block(camera.view_matrix, camera.projection_matrix, self.model_matrix))
+        self.transforms_buffer.bind_to_uniform_block(0)
+
+        culled = self.__cull_objects(camera) if self.frustum_culling else set()
+
+        names = []
+        for object_name, (mode, configure_func, vaos) in self.vaos_all.items():
+            buffers = self.buffers_all[object_name]
+
+            # Only what is drawn can be picked: objects without materials are skipped like hidden ones.
+            # Level-of-detail nodes (and batched objects) are not pickable.
+            if object_name in culled or not buffers.get('visible', True) or len(vaos) == 0 or 'lod' in buffers:
+                continue
+
+            buffers.get('object_buffer', self.default_object_buffer).bind_to_uniform_block(1)
+
+            if object_name in self.pick_vaos:
+                vao = self.__update_vao_layout(buffers, self.pick_vaos[object_name])
+            else:
+                vao = self.__create_vao(buffers, (self.programs_instanced if buffers['type'] == 'instances' else self.programs_default)['pick'])
+            self.pick_vaos[object_name] = vao
+
+            names.append(object_name)
+            vao.program['object_id'] = len(names)
+
+            configure_func(self.context)
+            vao.render(mode=mode)
+
+        return names
+
+    def start_recording(self, path, fps=30, format='png', queue_size=64, policy='block'):
+        # Record the rendered frames (without GUI) to the directory `path`.
+        # The format can be 'png' (image sequence), 'npz' or 'raw' (chunks of frames).
+        # If the writer cannot keep up, the policy 'block' stalls the render loop and 'drop' skips frames.
+        self.__enqueue_command(lambda: self.__start_recording(path, fps, format, queue_size, policy), wait=True)
+
+    def __start_recording(self, path, fps, format, queue_size, policy):
+        if self.headless:
+            raise RuntimeError("Recording requires a window, use `render_to_array` in headless mode.")
+
+        if self.recorder is not None:
+            self.__stop_recording()
+
+        self.recorder = FrameRecorder(self.context, path, fps, format, queue_size, policy)
+
+    def stop_recording(self):
+        # Wait until all frames are written
+        recorder = self.__enqueue_command(lambda: self.__stop_recording(), wait=True)
+        if recorder is not None:
+            recorder.join()
+
+    def __stop_recording(self):
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.release()
+            self.recorder = None
+        return recorder
+
+    def synchronize(self, wait=True):
+        # Wait until all previously enqueued commands are executed (or return a future that is resolved then)
         if not wait:
-            self.command_queue.put(command)
+            return self.__enqueue_command(lambda: None)
+        self.__enqueue_command(lambda: None, wait=True)
+
+    def close(self):
+        return self.__enqueue_command(lambda: self.__close())
+
+    def __close(self):
+        if self.headless:
+            self.should_close = True
         else:
-            event = threading.Event()
-            def execute_and_set():
-                command()
-                event.set()
-            self.command_queue.put(execute_and_set)
-            event.wait()
+            glfw.set_window_should_close(self.window, True)
+
+    def command_statistics(self):
+        # Counters of the command queue, including the number of dropped (superseded) updates
+        return self.command_queue.statistics()
+
+    def __enqueue_command(self, command, wait=False, object_name=None, operation=None, droppable=False):
+        # Returns a future that is resolved when the command was executed (or superseded by a newer command that was executed).
+        # With `wait`, the result of the command is returned instead. Only `droppable` commands (streamed geometry)
+        # can be dropped by a bounded command queue.
+        on_render_thread = threading.current_thread() is self.render_thread
+
+        if wait and on_render_thread:
+            # Callbacks (e.g. of the mouse) run on the render thread, which cannot wait for itself
+            return command()
+
+        future = Future()
+        self.command_queue.put(command, object_name=object_name, operation=None if wait else operation, droppable=droppable and not wait, future=future, block=not on_render_thread)
+        self.__wake_up()
+
+        return future.result() if wait else future
+
+    def __upload_buffer(self, buffers, name, data):
+        buffer = buffers.get(name, None)
+
+        self.frame_upload_bytes += data.nbytes
+
+        if buffer is not None and data.nbytes <= buffer.size:
+            # Orphan the storage so the driver does not stall on draws still using it
+            buffer.orphan()
+            buffer.write(data)
+            return
+
+        # Grow geometrically, so objects that slowly grow are not reallocated on every update
+        size = data.nbytes
+        if buffer is not None:
+            size = max(size, int(self.buffer_growth_factor * buffer.size))
+            buffer.release()
+
+        buffer = self.context.buffer(reserve=max(size, 4))
+        buffer.write(data)
+        buffers[name] = buffer
+
+    def __write_buffer_range(self, buffers, name, data, offset, count):
+        # Write attribute data of `count` vertices, starting at vertex `offset`
+        buffer = buffers[name]
+
+        if offset == 0 and count == buffers['num_vertices']:
+            buffer.orphan()
+
+        buffer.write(data, offset=(data.nbytes // count)*offset)
+        self.frame_upload_bytes += data.nbytes
+
+    def __release_buffer(self, buffers, name):
+        buffer = buffers.pop(name, None)
+        if buffer is not None:
+            buffer.release()
 
     def __create_content_for_program(self, buffers, program):
         # [
@@ -376,73 +1534,147 @@ class MeshViewer:
         #     (self.vcbo, '3f', 'color'),
         # ],
 
-        content = [(buffers['vbo'], '3f', 'position')]
+        if buffers['type'] == 'instances':
+            # Vertex attributes of the base object and per-instance attributes
+            content = self.__create_content_for_program(self.buffers_all[buffers['base']], program)
+
+            attributes = ['instance_matrix'] + (['instance_normal_matrix'] if program.get('instance_normal_matrix', None) else [])
+            instance_format = '16f ' + ('9f' if len(attributes) == 2 else '36x') + ' /i'
+            content += [(buffers['instance_data'], instance_format, *attributes)]
+
+            if program.get('instance_color', None):
+                content += [(buffers['instance_colors'], '4f /i', 'instance_color')]
+
+            return content
+
+        if 'interleaved' in buffers:
+            # A single strided buffer holds all attributes of the interleaved vertices
+            attributes = [name for name in buffers['interleaved'].names if name == 'position' or program.get(name, None)]
+            vertex_format, attributes = create_vertex_format(buffers['interleaved'], attributes)
+            content = [(buffers['vbo'], vertex_format, *attributes)]
+        else:
+            content = [(buffers['vbo'], get_buffer_format(buffers['vertex_format'], 'position'), 'position')]
 
         if 'vnbo' in buffers and program.get('normal', None):
-            content += [(buffers['vnbo'], '3f', 'normal')]
+            content += [(buffers['vnbo'], get_buffer_format(buffers['vertex_format'], 'normal'), 'normal')]
 
         if 'vcbo' in buffers and program.get('color', None):  
-            content += [(buffers['vcbo'], '3f', 'color')]
+            content += [(buffers['vcbo'], get_buffer_format(buffers['vertex_format'], 'color'), 'color')]
         
         return content
 
-    def __create_mesh_vao(self, buffers, program):
-        return self.context.vertex_array(
+    def __get_vertex_count(self, buffers, edges=False):
+        if buffers['type'] == 'instances':
+            return self.__get_vertex_count(self.buffers_all[buffers['base']], edges)
+        if edges:
+            return buffers['num_edge_indices']
+        return buffers['num_indices'] if buffers['type'] == 'mesh' else buffers['num_vertices']
+
+    def __update_edges(self, buffers, f_flat):
+        # Line indices of the unique edges of a mesh
+        e_flat = compute_unique_edges(f_flat)
+        self.__upload_buffer(buffers, 'eibo', e_flat)
+        buffers['num_edge_indices'] = len(e_flat)
+        buffers['edge_faces'] = np.array(f_flat)
+
+    def __get_edge_buffer(self, buffers):
+        if not 'eibo' in buffers:
+            # The faces are only kept on the GPU
+            f_flat = np.frombuffer(buffers['ibo'].read(size=4*buffers['num_indices']), dtype=np.int32)
+            self.__update_edges(buffers, f_flat)
+        return buffers['eibo']
+
+    def __create_vao_layout(self, buffers, program, edges=False):
+        # The layout identifies the buffers and formats bound by a VAO and the primitive mode if it differs from the object's.
+        # Buffer objects are compared by identity, so reallocated buffers change the layout.
+        content = self.__create_content_for_program(buffers, program)
+        vertex_buffers = self.buffers_all[buffers['base']] if buffers['type'] == 'instances' else buffers
+        if edges:
+            return (program, tuple(content), self.__get_edge_buffer(vertex_buffers), moderngl.LINES)
+        index_buffer = vertex_buffers['ibo'] if vertex_buffers['type'] == 'mesh' else None
+        return (program, tuple(content), index_buffer, None)
+
+    def __create_vao(self, buffers, program, layout=None, edges=False):
+        if layout is None:
+            layout = self.__create_vao_layout(buffers, program, edges)
+        program, content, index_buffer, mode = layout
+
+        vao = self.context.vertex_array(
             program,
-            self.__create_content_for_program(buffers, program),
-            index_buffer=buffers['ibo'],
+            list(content),
+            index_buffer=index_buffer,
             index_element_size=4
         )
-    
-    def __create_point_vao(self, buffers, program):
-        return self.context.vertex_array(
-            program,
-            self.__create_content_for_program(buffers, program)
-        )
+        vao.extra = layout
 
-    def __create_line_vao(self, buffers, program):
-        return self.context.vertex_array(
-            program,
-            self.__create_content_for_program(buffers, program)
-        )
+        # Buffers may have a larger capacity than the actual data
+        vao.vertices = self.__get_vertex_count(buffers, mode is not None)
+        if buffers['type'] == 'instances':
+            vao.instances = buffers['num_instances']
+
+        return vao
+
+    def __update_vao_layout(self, buffers, vao):
+        edges = vao.extra[3] is not None
+        layout = self.__create_vao_layout(buffers, vao.program, edges)
+
+        if layout == vao.extra:
+            vao.vertices = self.__get_vertex_count(buffers, edges)
+            if buffers['type'] == 'instances':
+                vao.instances = buffers['num_instances']
+            return vao
+
+        vao.release()
+        return self.__create_vao(buffers, layout[0], layout)
 
     def __update_vao(self, object_name):
         assert object_name in self.buffers_all
 
         buffers = self.buffers_all[object_name]
 
-        if buffers['type'] == 'mesh':
-            if object_name in self.vaos_all:
-                # Update the VAOs and preserve the programs
-                vaos = []
-                for v in self.vaos_all[object_name][2]:
-                    vaos += [self.__create_mesh_vao(buffers, v.program)]
-            else:
-                # Create a VAO with default material
-                vaos = [self.__create_mesh_vao(buffers, self.programs_default[self.program_name_default])]
+        # Instances are drawn like their base object
+        primitive_buffers = self.buffers_all[buffers['base']] if buffers['type'] == 'instances' else buffers
+
+        if object_name in self.vaos_all:
+            # Update the VAOs and preserve the programs.
+            # VAOs are only rebuilt if the buffers or their layout changed.
+            vaos = [self.__update_vao_layout(buffers, v) for v in self.vaos_all[object_name][2]]
+        else:
+            # Create a VAO with default material
+            programs = self.programs_instanced if buffers['type'] == 'instances' else self.programs_default
+            program_name = self.program_name_default if primitive_buffers['type'] == 'mesh' else 'flat'
+            vaos = [self.__create_vao(buffers, programs[program_name])]
 
+        if primitive_buffers['type'] == 'mesh':
             # We control the 'in_vert' and `in_color' variables
             self.vaos_all[object_name] = (
                 moderngl.TRIANGLES,
                 lambda context: None,
                 vaos
             )
-        elif buffers['type'] == 'points':
+        elif primitive_buffers['type'] == 'points':
             def configure_context(context):
-                context.point_size = buffers['point_size']
+                context.point_size = primitive_buffers['point_size']
 
             # We control the 'in_vert' and `in_color' variables
             self.vaos_all[object_name] = (
                 moderngl.POINTS,
                 configure_context,
-                [self.__create_point_vao(buffers, self.programs_default['flat'])]
+                vaos
             )
-        elif buffers['type'] == 'lines':
+        elif primitive_buffers['type'] == 'lines':
             # We control the 'in_vert' and `in_color' variables
             self.vaos_all[object_name] = (
                 moderngl.LINES,
                 lambda context: None,
-                [self.__create_line_vao(buffers, self.programs_default['flat'])]
+                vaos
             )
         else:
-            raise RuntimeError(f"Unknown object type {buffers['type']}")
+            raise RuntimeError(f"Unknown object type {primitive_buffers['type']}")
+
+        self.__update_object_block(object_name)
+
+        # Instances use the buffers of their base object
+        for name, instance_buffers in self.buffers_all.items():
+            if instance_buffers.get('base', None) == object_name and name in self.vaos_all:
+                self.__update_vao(name)